@@ -9,6 +9,7 @@ from models.verification import *
 from models.hobbies import *
 from models.chats import *
 from models.notifications import *
+from models.mail import *
 
 from os import getenv
 from alembic import context
@@ -75,7 +76,6 @@ def run_migrations_online() -> None:
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
-    target_metadata.create_all(connectable)
     with connectable.connect() as connection:
         context.configure(
             connection=connection, target_metadata=target_metadata
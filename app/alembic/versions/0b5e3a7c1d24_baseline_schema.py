@@ -0,0 +1,166 @@
+"""baseline schema
+
+Revision ID: 0b5e3a7c1d24
+Revises:
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import fastapi_users_db_sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b5e3a7c1d24'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # схема до появления миграций; базы, созданные через create_all, уже её содержат
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('cities'):
+        op.create_table(
+            'cities',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('name', sa.String(), nullable=False),
+        )
+    if not inspector.has_table('institutions'):
+        op.create_table(
+            'institutions',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('city_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('cities.id'), nullable=False),
+        )
+    if not inspector.has_table('images'):
+        op.create_table(
+            'images',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+        )
+    if not inspector.has_table('hobbies'):
+        op.create_table(
+            'hobbies',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('name', sa.String(), nullable=False),
+        )
+    if not inspector.has_table('users'):
+        op.create_table(
+            'users',
+            sa.Column('id', fastapi_users_db_sqlalchemy.generics.GUID(),
+                      primary_key=True),
+            sa.Column('email', sa.String(320), nullable=False),
+            sa.Column('hashed_password', sa.String(1024), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=False),
+            sa.Column('is_superuser', sa.Boolean(), nullable=False),
+            sa.Column('is_verified', sa.Boolean(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('register_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+            sa.Column('birthdate', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('image_id', sa.UUID(as_uuid=True), sa.ForeignKey(
+                'images.id', ondelete='SET NULL'), nullable=True),
+            sa.Column('description', sa.String(), nullable=False),
+            sa.Column('verified', sa.Boolean(), nullable=False),
+            sa.Column('institution_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('institutions.id'), nullable=True),
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    if not inspector.has_table('user_hobbies'):
+        op.create_table(
+            'user_hobbies',
+            sa.Column('user_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('hobby_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('hobbies.id'), primary_key=True),
+            sa.Column('creation_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+        )
+    if not inspector.has_table('user_likes'):
+        op.create_table(
+            'user_likes',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('user_id', sa.UUID(as_uuid=True), sa.ForeignKey(
+                'users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('liked_user_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('like', sa.Boolean(), nullable=False),
+            sa.Column('like_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+        )
+    if not inspector.has_table('chats'):
+        op.create_table(
+            'chats',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('user_id_1', sa.UUID(as_uuid=True), sa.ForeignKey(
+                'users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('user_id_2', sa.UUID(as_uuid=True), sa.ForeignKey(
+                'users.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('creation_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+        )
+    if not inspector.has_table('messages'):
+        op.create_table(
+            'messages',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('chat_id', sa.UUID(as_uuid=True), sa.ForeignKey(
+                'chats.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('from_user_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('content', sa.String(), nullable=False),
+            sa.Column('creation_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+            sa.Column('read', sa.Boolean(), nullable=False),
+            sa.Column('updated', sa.Boolean(), nullable=False),
+            sa.Column('read_date', sa.DateTime(timezone=True), nullable=True),
+        )
+    if not inspector.has_table('notifications'):
+        op.create_table(
+            'notifications',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('user_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('message', sa.String(), nullable=False),
+            sa.Column('header', sa.String(), nullable=False),
+            sa.Column('read', sa.Boolean(), nullable=False),
+            sa.Column('creation_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+        )
+    if not inspector.has_table('verification_requests'):
+        op.create_table(
+            'verification_requests',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('creation_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+            sa.Column('user_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('updated_date', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('reviewed', sa.Boolean(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('birthdate', sa.DateTime(), nullable=False),
+            sa.Column('institution_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('institutions.id'), nullable=False),
+            sa.Column('real_photo_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('images.id'), nullable=False),
+            sa.Column('id_photo_id', sa.UUID(as_uuid=True),
+                      sa.ForeignKey('images.id'), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('verification_requests')
+    op.drop_table('notifications')
+    op.drop_table('messages')
+    op.drop_table('chats')
+    op.drop_table('user_likes')
+    op.drop_table('user_hobbies')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_table('users')
+    op.drop_table('hobbies')
+    op.drop_table('images')
+    op.drop_table('institutions')
+    op.drop_table('cities')
@@ -0,0 +1,46 @@
+"""outgoing mails outbox
+
+Revision ID: 30f10530d7cb
+Revises: d4da6d2ce905
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '30f10530d7cb'
+down_revision: Union[str, None] = 'd4da6d2ce905'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table('outgoing_mails'):
+        op.create_table(
+            'outgoing_mails',
+            sa.Column('id', sa.UUID(as_uuid=True), primary_key=True),
+            sa.Column('creation_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+            sa.Column('recipients', postgresql.ARRAY(sa.String()), nullable=False),
+            sa.Column('subject', sa.String(), nullable=False),
+            sa.Column('template_body', postgresql.JSONB(), nullable=False),
+            sa.Column('template_name', sa.String(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('next_attempt_at', sa.DateTime(timezone=True),
+                      nullable=False, server_default=sa.func.now()),
+            sa.Column('sent_date', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('last_error', sa.String(), nullable=True),
+        )
+    op.execute('''
+        CREATE INDEX IF NOT EXISTS ix_outgoing_mails_pending
+        ON outgoing_mails (next_attempt_at) WHERE sent_date IS NULL
+    ''')
+
+
+def downgrade() -> None:
+    op.drop_table('outgoing_mails')
@@ -0,0 +1,85 @@
+"""chat last message and unread counters
+
+Revision ID: 4fc343b7e42d
+Revises: 6720ecab08d4
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import fastapi_users_db_sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4fc343b7e42d'
+down_revision: Union[str, None] = '6720ecab08d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column['name']
+               for column in sa.inspect(op.get_bind()).get_columns('chats')}
+    if 'last_message_id' not in columns:
+        op.add_column('chats', sa.Column(
+            'last_message_id', sa.UUID(as_uuid=True), nullable=True))
+        op.create_foreign_key('fk_chats_last_message_id', 'chats', 'messages', [
+                              'last_message_id'], ['id'], ondelete='SET NULL')
+    if 'last_message_at' not in columns:
+        op.add_column('chats', sa.Column(
+            'last_message_at', sa.DateTime(timezone=True), nullable=True))
+    for column in ('unread_count_1', 'unread_count_2'):
+        if column not in columns:
+            op.add_column('chats', sa.Column(
+                column, sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute('''
+        UPDATE chats
+        SET last_message_id = last.id, last_message_at = last.creation_date
+        FROM (
+            SELECT DISTINCT ON (chat_id) chat_id, id, creation_date
+            FROM messages
+            ORDER BY chat_id, creation_date DESC, id DESC
+        ) AS last
+        WHERE last.chat_id = chats.id
+    ''')
+    op.execute('''
+        UPDATE chats SET
+            unread_count_1 = (
+                SELECT count(*) FROM messages
+                WHERE messages.chat_id = chats.id
+                    AND messages.from_user_id != chats.user_id_1
+                    AND NOT messages.read
+            ),
+            unread_count_2 = (
+                SELECT count(*) FROM messages
+                WHERE messages.chat_id = chats.id
+                    AND messages.from_user_id != chats.user_id_2
+                    AND NOT messages.read
+            )
+    ''')
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chats_user_id_1_last_message_at '
+            'ON chats (user_id_1, last_message_at DESC)'
+        )
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chats_user_id_2_last_message_at '
+            'ON chats (user_id_2, last_message_at DESC)'
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS ix_chats_user_id_1_last_message_at')
+        op.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS ix_chats_user_id_2_last_message_at')
+    op.drop_constraint('fk_chats_last_message_id', 'chats', type_='foreignkey')
+    op.drop_column('chats', 'unread_count_2')
+    op.drop_column('chats', 'unread_count_1')
+    op.drop_column('chats', 'last_message_at')
+    op.drop_column('chats', 'last_message_id')
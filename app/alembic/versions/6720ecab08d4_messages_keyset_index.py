@@ -0,0 +1,33 @@
+"""messages keyset index
+
+Revision ID: 6720ecab08d4
+Revises: 0b5e3a7c1d24
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import fastapi_users_db_sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6720ecab08d4'
+down_revision: Union[str, None] = '0b5e3a7c1d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_chat_id_creation_date_id '
+            'ON messages (chat_id, creation_date DESC, id DESC)'
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS ix_messages_chat_id_creation_date_id')
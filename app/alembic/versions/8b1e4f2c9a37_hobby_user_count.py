@@ -0,0 +1,41 @@
+"""hobby user_count counter
+
+Revision ID: 8b1e4f2c9a37
+Revises: ddeebd7654cc
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4f2c9a37'
+down_revision: Union[str, None] = 'ddeebd7654cc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        'ALTER TABLE hobbies ADD COLUMN IF NOT EXISTS user_count integer NOT NULL DEFAULT 0')
+    op.execute('''
+        UPDATE hobbies SET user_count = counts.user_count
+        FROM (
+            SELECT hobby_id, count(*) AS user_count
+            FROM user_hobbies
+            GROUP BY hobby_id
+        ) AS counts
+        WHERE counts.hobby_id = hobbies.id
+    ''')
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_hobbies_user_count ON hobbies (user_count DESC, id)')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_hobbies_user_count')
+    op.drop_column('hobbies', 'user_count')
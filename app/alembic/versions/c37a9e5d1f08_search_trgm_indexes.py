@@ -0,0 +1,41 @@
+"""pg_trgm search indexes
+
+Revision ID: c37a9e5d1f08
+Revises: 8b1e4f2c9a37
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c37a9e5d1f08'
+down_revision: Union[str, None] = '8b1e4f2c9a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+indexes = {
+    'ix_users_name_trgm': 'users USING gin (lower(name) gin_trgm_ops)',
+    'ix_users_email_trgm': 'users USING gin (lower(email) gin_trgm_ops)',
+    'ix_hobbies_name_trgm': 'hobbies USING gin (lower(name) gin_trgm_ops)',
+    'ix_cities_name_trgm': 'cities USING gin (lower(name) gin_trgm_ops)',
+    'ix_institutions_name_trgm': 'institutions USING gin (lower(name) gin_trgm_ops)',
+}
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, definition in indexes.items():
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}')
+
+
+def downgrade() -> None:
+    # расширение не удаляется: его могут использовать другие объекты БД
+    with op.get_context().autocommit_block():
+        for name in indexes:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
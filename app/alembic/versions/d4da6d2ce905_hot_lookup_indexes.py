@@ -0,0 +1,106 @@
+"""hot lookup indexes and unique likes/chat pairs
+
+Revision ID: d4da6d2ce905
+Revises: 4fc343b7e42d
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import fastapi_users_db_sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4da6d2ce905'
+down_revision: Union[str, None] = '4fc343b7e42d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+indexes = {
+    'ix_messages_chat_id_unread': 'messages (chat_id, from_user_id) WHERE read = false',
+    'ix_messages_from_user_id': 'messages (from_user_id)',
+    'ix_user_likes_liked_user_id_like': 'user_likes (liked_user_id, "like")',
+    'ix_notifications_user_id_read_creation_date': 'notifications (user_id, read, creation_date DESC)',
+    'ix_user_hobbies_hobby_id': 'user_hobbies (hobby_id)',
+    'ix_institutions_city_id': 'institutions (city_id)',
+    'ix_verification_requests_user_id': 'verification_requests (user_id)',
+}
+unique_indexes = {
+    'uq_user_likes_user_id_liked_user_id': 'user_likes (user_id, liked_user_id)',
+    'uq_chats_user_pair': 'chats (least(user_id_1, user_id_2), greatest(user_id_1, user_id_2))',
+}
+
+
+def upgrade() -> None:
+    # перед уникальными индексами убираем дубликаты: остается последний лайк
+    op.execute('''
+        DELETE FROM user_likes
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY user_id, liked_user_id
+                    ORDER BY like_date DESC NULLS LAST, id
+                ) AS position
+                FROM user_likes
+            ) AS ranked
+            WHERE position > 1
+        )
+    ''')
+    # и самый ранний чат пары, в который переносятся сообщения остальных
+    op.execute('''
+        CREATE TEMPORARY TABLE duplicate_chats ON COMMIT DROP AS
+        SELECT id, first_value(id) OVER (
+            PARTITION BY least(user_id_1, user_id_2), greatest(user_id_1, user_id_2)
+            ORDER BY creation_date, id
+        ) AS keep_id
+        FROM chats
+    ''')
+    op.execute('DELETE FROM duplicate_chats WHERE id = keep_id')
+    op.execute('''
+        UPDATE messages SET chat_id = duplicate_chats.keep_id
+        FROM duplicate_chats WHERE messages.chat_id = duplicate_chats.id
+    ''')
+    op.execute('''
+        UPDATE chats
+        SET last_message_id = last.id, last_message_at = last.creation_date
+        FROM (
+            SELECT DISTINCT ON (chat_id) chat_id, id, creation_date
+            FROM messages
+            ORDER BY chat_id, creation_date DESC, id DESC
+        ) AS last
+        WHERE last.chat_id = chats.id
+            AND chats.id IN (SELECT keep_id FROM duplicate_chats)
+    ''')
+    op.execute('''
+        UPDATE chats SET
+            unread_count_1 = (
+                SELECT count(*) FROM messages
+                WHERE messages.chat_id = chats.id
+                    AND messages.from_user_id != chats.user_id_1
+                    AND NOT messages.read
+            ),
+            unread_count_2 = (
+                SELECT count(*) FROM messages
+                WHERE messages.chat_id = chats.id
+                    AND messages.from_user_id != chats.user_id_2
+                    AND NOT messages.read
+            )
+        WHERE chats.id IN (SELECT keep_id FROM duplicate_chats)
+    ''')
+    op.execute('DELETE FROM chats WHERE id IN (SELECT id FROM duplicate_chats)')
+
+    with op.get_context().autocommit_block():
+        for name, definition in indexes.items():
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}')
+        for name, definition in unique_indexes.items():
+            op.execute(
+                f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in list(indexes) + list(unique_indexes):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
@@ -0,0 +1,45 @@
+"""content-addressed image blobs
+
+Revision ID: ddeebd7654cc
+Revises: 30f10530d7cb
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ddeebd7654cc'
+down_revision: Union[str, None] = '30f10530d7cb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # файлы существующих изображений не переносятся: у них blob_hash пустой
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('image_blobs'):
+        op.create_table(
+            'image_blobs',
+            sa.Column('hash', sa.String(64), primary_key=True),
+            sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('creation_date', sa.DateTime(timezone=True),
+                      server_default=sa.func.now()),
+            sa.Column('released_date', sa.DateTime(timezone=True), nullable=True),
+        )
+    columns = {column['name'] for column in inspector.get_columns('images')}
+    if 'blob_hash' not in columns:
+        op.add_column('images', sa.Column('blob_hash', sa.String(64), nullable=True))
+        op.create_foreign_key('images_blob_hash_fkey', 'images', 'image_blobs',
+                              ['blob_hash'], ['hash'])
+    op.execute('CREATE INDEX IF NOT EXISTS ix_images_blob_hash ON images (blob_hash)')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_images_blob_hash', table_name='images')
+    op.drop_constraint('images_blob_hash_fkey', 'images', type_='foreignkey')
+    op.drop_column('images', 'blob_hash')
+    op.drop_table('image_blobs')
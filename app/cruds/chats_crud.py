@@ -3,24 +3,20 @@ from typing import List, Tuple
 import uuid
 from models.user import User
 from cruds.base_crud import BaseCRUD
+from cruds.search import search_filter
 from models.chats import Chat, Message
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import and_, func, or_, update
+from sqlalchemy import case, func, tuple_, union_all, update
 from cruds.users_cruds import UsersCrud
 
 
 class ChatsCrud(BaseCRUD):
 
-    def get_unread_messages_subquery(self, user_id: uuid.UUID):
-        unread_messages_subquery = select(
-            func.count(Message.id).label('unread_count')
-        ).join(Message.chat).filter(
-            Message.chat_id == Chat.id,
-            Message.from_user_id != user_id,
-            Message.read == False
-        ).scalar_subquery()
-        return unread_messages_subquery
+    @staticmethod
+    def unread_count_column(user_id: uuid.UUID):
+        '''Счётчик непрочитанных сообщений чата для участника user_id'''
+        return case((Chat.user_id_1 == user_id, Chat.unread_count_1), else_=Chat.unread_count_2)
 
     async def read_messages(self, chat_id: uuid.UUID, user_id: uuid.UUID):
         await self.db.execute(
@@ -33,43 +29,79 @@ class ChatsCrud(BaseCRUD):
                 read_date=datetime.now()
             )
         )
+        await self.db.execute(
+            update(Chat).where(Chat.id == chat_id).values(
+                unread_count_1=case(
+                    (Chat.user_id_1 == user_id, 0), else_=Chat.unread_count_1),
+                unread_count_2=case(
+                    (Chat.user_id_2 == user_id, 0), else_=Chat.unread_count_2),
+            )
+        )
         await self.db.commit()
 
-    async def get_user_chats(self, user_id: uuid.UUID, page: int, page_size: int = 20, search_query: str = None) -> List[Tuple[Chat, int]]:
-        '''Returns user chats with unread messages count'''
+    async def get_user_chats(self, user_id: uuid.UUID, page: int, page_size: int = 20, search_query: str = None,
+                             load_users: bool = True) -> List[Tuple[Chat, int]]:
+        '''Returns user chats with unread messages count
+
+        Чаты, где пользователь первый и второй участник, выбираются двумя
+        ветками UNION ALL: каждая читает первые end строк индекса
+        (user_id_N, last_message_at DESC) без сортировки всех чатов.
+
+        При load_users=False загружается только последнее сообщение,
+        профили участников берутся из UsersCrud.get_user_profiles.
+        '''
         end = page * page_size
         start = end - page_size
-        subquery = select(
-            Message.chat_id,
-            func.max(Message.creation_date).label('max_creation_date')
-        ).group_by(Message.chat_id).subquery()
-
-        query = select(Chat, self.get_unread_messages_subquery(user_id=user_id))\
-            .join(subquery, and_(Chat.id == subquery.c.chat_id))\
-            .join(Message, and_(Message.chat_id == Chat.id, Message.creation_date == subquery.c.max_creation_date))\
-            .where((Chat.user_id_1 == user_id) | (Chat.user_id_2 == user_id))
-
-        if search_query:
-            query = query.join(
-                User, or_(Chat.user_id_1 == User.id, Chat.user_id_2 == User.id)
-            ).where(User.name.like(f'%{search_query}%'))
-            if user_id:
-                query = query.where(User.id != user_id)
+
+        def branch(user_column, other_user_column):
+            query = select(Chat.id, Chat.last_message_at)\
+                .where(user_column == user_id)\
+                .where(Chat.last_message_id != None)
+            if search_query:
+                query = query.join(User, User.id == other_user_column)\
+                    .where(search_filter(search_query, User.name))
+            return query.order_by(Chat.last_message_at.desc()).limit(end)
+        # чат с самим собой попадает только в первую ветку
+        page_ids = union_all(
+            branch(Chat.user_id_1, Chat.user_id_2),
+            branch(Chat.user_id_2, Chat.user_id_1).where(Chat.user_id_1 != user_id)
+        ).subquery()
+        page_ids = select(page_ids.c.id, page_ids.c.last_message_at)\
+            .order_by(page_ids.c.last_message_at.desc())\
+            .slice(start, end)\
+            .subquery()
 
         result = await self.db.execute(
-            query
-            .where(User.name.like(f'%{search_query}%') & (User.id != user_id) if search_query else True)
-            .order_by(subquery.c.max_creation_date.desc())
-            .slice(start, end)
+            select(Chat, self.unread_count_column(user_id=user_id))
+            .join(page_ids, page_ids.c.id == Chat.id)
+            .order_by(page_ids.c.last_message_at.desc())
             .options(
-                *self.selectinload_chat()
+                *(self.selectinload_chat() if load_users else [selectinload(Chat.last_message)])
             )
         )
         return result.all()
 
     async def read_message(self, message: Message):
-        message.read = True
-        message.read_date = datetime.now()
+        result = await self.db.execute(
+            update(Message).where(
+                Message.id == message.id,
+                Message.read == False
+            ).values(
+                read=True,
+                read_date=datetime.now()
+            ).returning(Message.id)
+        )
+        if result.scalar() is not None:
+            reader_id = message.get_to_user_id(
+                from_user_id=message.from_user_id)
+            await self.db.execute(
+                update(Chat).where(Chat.id == message.chat_id).values(
+                    unread_count_1=case(
+                        (Chat.user_id_1 == reader_id, func.greatest(Chat.unread_count_1 - 1, 0)), else_=Chat.unread_count_1),
+                    unread_count_2=case(
+                        (Chat.user_id_2 == reader_id, func.greatest(Chat.unread_count_2 - 1, 0)), else_=Chat.unread_count_2),
+                )
+            )
         return await self.update(message)
 
     async def get_message(self, message_id: uuid.UUID):
@@ -81,7 +113,7 @@ class ChatsCrud(BaseCRUD):
 
     async def create_chat(self, from_user_id: uuid.UUID, to_user_id: uuid.UUID, message: str):
         chat = await self.create(Chat(user_id_1=from_user_id, user_id_2=to_user_id))
-        await self.create(Message(chat_id=chat.id, from_user_id=from_user_id, content=message))
+        await self.create_message(chat_id=chat.id, from_user_id=from_user_id, content=message)
         return chat
 
     async def get_chat(self, chat_id: uuid.UUID):
@@ -92,6 +124,20 @@ class ChatsCrud(BaseCRUD):
         )
         return query.scalars().first()
 
+    async def get_chats(self, chats_ids: List[uuid.UUID]) -> List[Chat]:
+        query = await self.db.execute(
+            select(Chat).where(Chat.id.in_(chats_ids)).options(
+                *self.selectinload_chat()
+            )
+        )
+        return query.scalars().all()
+
+    async def get_chat_members(self, chat_id: uuid.UUID) -> Tuple[uuid.UUID, uuid.UUID] | None:
+        query = await self.db.execute(
+            select(Chat.user_id_1, Chat.user_id_2).where(Chat.id == chat_id)
+        )
+        return query.first()
+
     async def get_chat_by_users(self, user_id_1: uuid.UUID, user_id_2: uuid.UUID):
         query = await self.db.execute(
             select(Chat).where(
@@ -123,16 +169,30 @@ class ChatsCrud(BaseCRUD):
 
     async def get_unread_count(self, chat_id: uuid.UUID, user_id: uuid.UUID):
         query = await self.db.execute(
-            select(func.count(Message.id)).join(Message.chat).filter(
-                Message.chat_id == chat_id,
-                Message.from_user_id != user_id,
-                Message.read == False
-            )
+            select(self.unread_count_column(user_id=user_id)).where(
+                Chat.id == chat_id)
         )
         return query.scalar()
 
     async def create_message(self, chat_id: uuid.UUID, from_user_id: uuid.UUID, content: str) -> Message:
-        return await self.create(Message(chat_id=chat_id, from_user_id=from_user_id, content=content))
+        '''Создает сообщение и в той же транзакции обновляет последнее сообщение и счётчик непрочитанных чата'''
+        message = Message(chat_id=chat_id,
+                          from_user_id=from_user_id, content=content)
+        self.db.add(message)
+        await self.db.flush()
+        await self.db.execute(
+            update(Chat).where(Chat.id == chat_id).values(
+                last_message_id=message.id,
+                # now() постоянен в транзакции и совпадает с messages.creation_date
+                last_message_at=func.now(),
+                unread_count_1=case(
+                    (Chat.user_id_1 == from_user_id, Chat.unread_count_1), else_=Chat.unread_count_1 + 1),
+                unread_count_2=case(
+                    (Chat.user_id_2 == from_user_id, Chat.unread_count_2), else_=Chat.unread_count_2 + 1),
+            )
+        )
+        await self.db.commit()
+        return message
 
     async def get_messages(self, chat_id: uuid.UUID, page: int, page_size: int = 20):
         end = page * page_size
@@ -146,3 +206,26 @@ class ChatsCrud(BaseCRUD):
 
         )
         return query.scalars().all()
+
+    async def get_messages_by_cursor(self, chat_id: uuid.UUID, before: Tuple[datetime, uuid.UUID] = None,
+                                     after: Tuple[datetime, uuid.UUID] = None, page_size: int = 20) -> List[Message]:
+        '''Keyset-пагинация: сообщения старше before или новее after (только один из курсоров), от новых к старым'''
+        key = tuple_(Message.creation_date, Message.id)
+        query = select(Message).where(Message.chat_id == chat_id)
+        if after:
+            query = query.where(key > tuple_(*after))\
+                .order_by(Message.creation_date.asc(), Message.id.asc())
+        else:
+            if before:
+                query = query.where(key < tuple_(*before))
+            query = query.order_by(
+                Message.creation_date.desc(), Message.id.desc())
+        result = await self.db.execute(
+            query.limit(page_size).options(selectinload(Message.from_user).options(
+                *UsersCrud.selectinload_user_options()
+            ))
+        )
+        messages = result.scalars().all()
+        if after:
+            messages.reverse()
+        return messages
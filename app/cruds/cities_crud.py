@@ -1,5 +1,6 @@
 import uuid
 from cruds.base_crud import BaseCRUD
+from cruds.search import search_filter, search_rank
 from models.locations import City, Institution
 from sqlalchemy.future import select
 
@@ -11,7 +12,8 @@ class CitiesCrud(BaseCRUD):
     async def get_cities(self, query: str = None, page: int = 1):
         def query_func(q):
             if query:
-                q = q.where(City.name.ilike(f"%{query}%"))
+                q = q.where(search_filter(query, City.name)).order_by(
+                    search_rank(query, City.name).desc(), City.name)
             return q
         return await self.paginate(
             City,
@@ -1,9 +1,52 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import List
 import uuid
 
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
 from cruds.base_crud import BaseCRUD
-from models.files import Image
+from models.files import Image, ImageBlob
 
 
 class FilesCRUD(BaseCRUD):
     async def get_image_by_id(self, image_id: uuid.UUID) -> Image:
         return await self.get(image_id, Image)
+
+    async def get_existing_images_ids(self, images_ids: List[uuid.UUID]) -> List[uuid.UUID]:
+        query = await self.db.execute(select(Image.id).where(Image.id.in_(images_ids)))
+        return query.scalars().all()
+
+    async def get_existing_blobs_hashes(self, blobs_hashes: List[str]) -> List[str]:
+        query = await self.db.execute(select(ImageBlob.hash).where(ImageBlob.hash.in_(blobs_hashes)))
+        return query.scalars().all()
+
+    async def acquire_blobs(self, blobs_hashes: List[str]) -> None:
+        '''Увеличивает счетчики ссылок, создавая недостающие blobs. Без коммита'''
+        counts = Counter(blobs_hashes)
+        upsert = insert(ImageBlob).values([
+            dict(hash=blob_hash, ref_count=count) for blob_hash, count in counts.items()
+        ])
+        await self.db.execute(upsert.on_conflict_do_update(
+            index_elements=[ImageBlob.hash],
+            set_={'ref_count': ImageBlob.ref_count + upsert.excluded.ref_count,
+                  'released_date': None}
+        ))
+
+    async def delete_orphan_blobs(self, grace_period: float) -> List[str]:
+        '''Удаляет blobs без ссылок старше grace_period секунд. Без коммита.
+
+        Строки остаются заблокированными до коммита, поэтому загрузка того же
+        изображения дождется его и создаст blob заново.
+        '''
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_period)
+        query = await self.db.execute(
+            delete(ImageBlob)
+            .where(
+                ImageBlob.ref_count <= 0,
+                ImageBlob.released_date < cutoff,
+                ~select(Image.id).where(Image.blob_hash == ImageBlob.hash).exists()
+            )
+            .returning(ImageBlob.hash)
+        )
+        return query.scalars().all()
@@ -1,47 +1,60 @@
 import uuid
 
-from sqlalchemy import desc,  join
+from sqlalchemy import update
 from models.user import User
 from cruds.base_crud import BaseCRUD
+from cruds.search import search_filter, search_rank
 from models.hobbies import Hobby, UserHobby
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy.sql.functions import count
 from schemas.hobbies import HobbyWithLike as HobbyWithLikeSchema
+from utilities.profiles import profile_cache
+from utilities.recommendations import scoring_profiles
 
 
 class HobbiesCrud(BaseCRUD):
     async def get_hobbies(self, page: int, hobby_query: str = None, current_user: User = None, page_size: int = 30, used: bool = False) -> list[HobbyWithLikeSchema]:
+        '''Хобби пользователя первыми, затем остальные по убыванию user_count.
+
+        Хобби пользователя немного, они выбираются отдельным запросом, а
+        остальные - чтением первых строк индекса ix_hobbies_user_count.
+        used оставляет только хобби, которые есть хотя бы у одного пользователя.
+        '''
         end = page * page_size
         start = end - page_size
+        filters = []
+        order_by = []
+        if hobby_query:
+            filters.append(search_filter(hobby_query, Hobby.name))
+            order_by.append(search_rank(hobby_query, Hobby.name).desc())
+        if used:
+            filters.append(Hobby.user_count > 0)
+        order_by += [Hobby.user_count.desc(), Hobby.id]
 
-        async def get_hobbies_(liked):
-            liked_ = liked and current_user
-            query = select(Hobby).join(
-                UserHobby, Hobby.id == UserHobby.hobby_id, isouter=not used).order_by(
-                desc(count(UserHobby.user_id))).group_by(Hobby.id)
-            query = query.slice(start, end)
-            if hobby_query:
-                query = query.where(Hobby.name.ilike(f"%{hobby_query}%"))
-            if liked_:
-                query = query.where(UserHobby.user_id == current_user.id)
-            elif  used:
-                query = query.where(UserHobby.user_id != current_user.id)
-            query = query.slice(start, end)
-            return (await self.db.execute(query)).scalars().all()
-        liked_hobbies = await get_hobbies_(True)
+        liked_hobbies = []
+        if current_user:
+            query = await self.db.execute(
+                select(Hobby)
+                .join(UserHobby, UserHobby.hobby_id == Hobby.id)
+                .where(UserHobby.user_id == current_user.id, *filters)
+                .order_by(*order_by)
+            )
+            liked_hobbies = query.scalars().all()
         hobbies = []
-        for hobby in liked_hobbies:
+        for hobby in liked_hobbies[start:end]:
             hobby_obj = HobbyWithLikeSchema.model_validate(hobby)
             hobby_obj.liked = True
             hobbies.append(hobby_obj)
-        if len(liked_hobbies) > page_size:
+        if len(hobbies) == page_size:
             return hobbies
-        liked_hobbies_ids = [hobby.id for hobby in liked_hobbies]
-        other_hobbies = await get_hobbies_(False)
-        for hobby in other_hobbies:
-            if hobby.id in liked_hobbies_ids:
-                continue
+
+        query = select(Hobby).where(*filters)
+        if liked_hobbies:
+            query = query.where(Hobby.id.not_in([hobby.id for hobby in liked_hobbies]))
+        query = query.order_by(*order_by)\
+            .offset(max(start - len(liked_hobbies), 0))\
+            .limit(page_size - len(hobbies))
+        for hobby in (await self.db.execute(query)).scalars().all():
             hobby_obj = HobbyWithLikeSchema.model_validate(hobby)
             hobby_obj.liked = False
             hobbies.append(hobby_obj)
@@ -51,6 +64,10 @@ class HobbiesCrud(BaseCRUD):
         query = await self.db.execute(select(Hobby).where(Hobby.id == hobby_id))
         return query.scalars().first()
 
+    async def get_hobbies_by_ids(self, hobbies_ids: list[uuid.UUID]) -> list[Hobby]:
+        query = await self.db.execute(select(Hobby).where(Hobby.id.in_(hobbies_ids)))
+        return query.scalars().all()
+
     async def get_hobby_with_like(self, hobby_id: uuid.UUID, user: User) -> HobbyWithLikeSchema:
         is_liked_subquery = select(UserHobby).where(
             UserHobby.user_id == user.id if user else None).where(UserHobby.hobby_id == Hobby.id).exists()
@@ -84,7 +101,25 @@ class HobbiesCrud(BaseCRUD):
         return hobbies_with_like
 
     async def add_user_hobby(self, user: User, hobby: Hobby) -> UserHobby:
-        return await self.create(UserHobby(user_id=user.id, hobby_id=hobby.id))
+        user_hobby = UserHobby(user_id=user.id, hobby_id=hobby.id)
+        self.db.add(user_hobby)
+        await self.db.flush()
+        await self.db.execute(update(Hobby).where(Hobby.id == hobby.id).values(
+            user_count=Hobby.user_count + 1))
+        await self.db.commit()
+        scoring_profiles.toggle_hobby(user.id, hobby.id, added=True)
+        profile_cache.invalidate(user.id)
+        return user_hobby
+
+    async def delete_user_hobby(self, user_hobby: UserHobby) -> None:
+        await self.db.delete(user_hobby)
+        await self.db.flush()
+        await self.db.execute(update(Hobby).where(Hobby.id == user_hobby.hobby_id).values(
+            user_count=Hobby.user_count - 1))
+        await self.db.commit()
+        scoring_profiles.toggle_hobby(
+            user_hobby.user_id, user_hobby.hobby_id, added=False)
+        profile_cache.invalidate(user_hobby.user_id)
 
     async def get_user_hobby(self, user: User, hobby: Hobby) -> UserHobby:
         query = await self.db.execute(select(UserHobby).where(UserHobby.user_id == user.id).where(UserHobby.hobby_id == hobby.id))
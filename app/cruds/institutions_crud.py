@@ -1,5 +1,6 @@
 import uuid
 from cruds.base_crud import BaseCRUD
+from cruds.search import search_filter, search_rank
 from models.locations import Institution
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -14,11 +15,16 @@ class InstitutionsCrud(BaseCRUD):
         query = await self.db.execute(select(Institution).where(Institution.id == institution_id).options(selectinload(Institution.city)))
         return query.scalars().first()
 
+    async def get_institutions_by_ids(self, institutions_ids: list[uuid.UUID]) -> list[Institution]:
+        query = await self.db.execute(select(Institution).where(Institution.id.in_(institutions_ids)))
+        return query.scalars().all()
+
     async def get_institutions(self, city_id: uuid.UUID, search_query: str = None, page: int = 1) -> list[Institution]:
         def query_func(q):
             q = q.where(Institution.city_id == city_id)
             if search_query:
-                q = q.where(Institution.name.ilike(f"%{search_query}%"))
+                q = q.where(search_filter(search_query, Institution.name)).order_by(
+                    search_rank(search_query, Institution.name).desc(), Institution.name)
             return q
         return await self.paginate(
             Institution,
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import uuid
+from sqlalchemy import select, update
+from cruds.base_crud import BaseCRUD
+from models.mail import OutgoingMail
+
+
+class MailCrud(BaseCRUD):
+
+    async def create_mail(self, recipients: List[str], subject: str, template_body: dict, template_name: str) -> OutgoingMail:
+        return await self.create(
+            OutgoingMail(
+                recipients=recipients,
+                subject=subject,
+                template_body=template_body,
+                template_name=template_name
+            )
+        )
+
+    async def claim_pending_mails(self, limit: int, max_attempts: int, lease: float) -> List[OutgoingMail]:
+        '''Забирает до limit писем, готовых к отправке, на lease секунд и фиксирует транзакцию.
+
+        SKIP LOCKED позволяет нескольким воркерам разбирать очередь, а
+        сдвиг next_attempt_at не дает другим воркерам взять те же письма,
+        пока идет отправка.
+        '''
+        now = datetime.now(timezone.utc)
+        pending = (
+            select(OutgoingMail.id)
+            .where(
+                OutgoingMail.sent_date.is_(None),
+                OutgoingMail.next_attempt_at <= now,
+                OutgoingMail.attempts < max_attempts
+            )
+            .order_by(OutgoingMail.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = await self.db.execute(
+            update(OutgoingMail)
+            .where(OutgoingMail.id.in_(pending.scalar_subquery()))
+            .values(next_attempt_at=now + timedelta(seconds=lease))
+            .returning(OutgoingMail)
+        )
+        mails = query.scalars().all()
+        await self.db.commit()
+        return mails
+
+    async def save_results(self, mails: List[OutgoingMail], results: Dict[uuid.UUID, str | None], backoff: float):
+        '''Отмечает отправленные письма, неудачные откладывает по экспоненте:
+        backoff, 2 * backoff, 4 * backoff...
+        '''
+        now = datetime.now(timezone.utc)
+        rows = []
+        for mail in mails:
+            error = results.get(mail.id, 'письмо не отправлено')
+            if error is None:
+                rows.append({'id': mail.id, 'sent_date': now, 'last_error': None})
+            else:
+                rows.append({
+                    'id': mail.id,
+                    'attempts': mail.attempts + 1,
+                    'last_error': error,
+                    'next_attempt_at': now + timedelta(seconds=backoff * 2 ** mail.attempts)
+                })
+        await self.db.execute(update(OutgoingMail), rows)
+        await self.db.commit()
@@ -5,7 +5,7 @@ from cruds.base_crud import BaseCRUD
 from models.locations import Institution
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import func, select, update
+from sqlalchemy import func, insert, select, update
 
 
 class NotificationsCrud(BaseCRUD):
@@ -27,6 +27,15 @@ class NotificationsCrud(BaseCRUD):
             )
         )
 
+    async def create_notifications(self, notifications: list[dict]) -> list[Notification]:
+        '''Создаёт уведомления одним многострочным INSERT'''
+        if not notifications:
+            return []
+        result = await self.db.scalars(insert(Notification).returning(Notification), notifications)
+        created = result.all()
+        await self.db.commit()
+        return created
+
     async def read_all_notifications(self, user_id: uuid.UUID) -> None:
         await self.db.execute(
             update(Notification).where(
@@ -0,0 +1,27 @@
+from sqlalchemy import ColumnElement, func, literal, or_
+
+
+def escape_like(term: str) -> str:
+    return term.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+
+def normalize_term(term: str) -> str:
+    '''Регистр сворачивается в Python (корректно для кириллицы), в запросе - lower()'''
+    return term.strip().lower()
+
+
+def search_filter(term: str, *columns) -> ColumnElement:
+    '''Подстрочный поиск по lower(column) LIKE '%term%'.
+
+    Условие совпадает с выражением GIN-индексов gin_trgm_ops (pg_trgm)
+    на lower(column), поэтому поиск с ведущим % не сканирует таблицу.
+    '''
+    pattern = f'%{escape_like(normalize_term(term))}%'
+    return or_(*(func.lower(column).like(pattern, escape='/') for column in columns))
+
+
+def search_rank(term: str, *columns) -> ColumnElement:
+    '''Степень совпадения term с лучшей из колонок для сортировки (pg_trgm word_similarity)'''
+    term = literal(normalize_term(term))
+    ranks = [func.word_similarity(term, func.lower(column)) for column in columns]
+    return ranks[0] if len(ranks) == 1 else func.greatest(*ranks)
@@ -1,16 +1,24 @@
+from datetime import datetime, timezone
 from typing import List
 import uuid
 from fastapi import UploadFile
-from sqlalchemy.orm import selectinload
-from sqlalchemy import func, select, or_, nulls_first, and_
+from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy import and_, func, select, nulls_first, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from models.locations import Institution
-from models.hobbies import UserHobby
+from models.hobbies import Hobby, UserHobby
 from models.files import Image
 from cruds.base_crud import BaseCRUD
+from cruds.search import search_filter
+from db.db import use_primary
 from utilities.files import save_image
+from utilities.auth import user_cache
+from utilities.profiles import profile_cache
+from utilities.recommendations import candidate_pool, scoring_profiles, scoring_sample_factor
 from models.user import User, UserLike
-from schemas.users import UserLikeFull, UserUpdate
-from users_controller import get_user_manager_context
+from schemas.users import Swipe, UserLike as UserLikeSchema, UserLikeFull, UserUpdate
+from users_controller import get_user_db_context, get_user_manager_context
 
 
 class UsersCrud(BaseCRUD):
@@ -23,6 +31,26 @@ class UsersCrud(BaseCRUD):
         query = await self.db.execute(select(User).where(User.id == user_id).options(*self.selectinload_user_options()))
         return query.scalars().first()
 
+    async def get_user_profiles(self, users_ids: List[uuid.UUID]) -> List[dict]:
+        '''Профили пользователей в порядке users_ids: из profile_cache, недостающие - одним запросом'''
+        profiles = profile_cache.get_many(users_ids)
+        missing = [user_id for user_id in dict.fromkeys(users_ids) if user_id not in profiles]
+        if missing:
+            # кэш заполняется с основной БД: отставшая реплика вернула бы профиль до правки
+            query = await use_primary(self.db).execute(
+                select(User).where(User.id.in_(missing)).options(*self.selectinload_user_options()))
+            for user in query.scalars().all():
+                profiles[user.id] = profile_cache.set(user)
+        return [profiles[user_id] for user_id in users_ids if user_id in profiles]
+
+    async def get_user_profile(self, user_id: uuid.UUID) -> dict | None:
+        profiles = await self.get_user_profiles([user_id])
+        return profiles[0] if profiles else None
+
+    def invalidate_user(self, user_id: uuid.UUID):
+        user_cache.invalidate(user_id)
+        profile_cache.invalidate(user_id)
+
     async def get_user_by_email(self, email: str) -> User:
         user = select(User).where(User.email == email).options(
             *self.selectinload_user_options())
@@ -38,6 +66,7 @@ class UsersCrud(BaseCRUD):
         image_model = await save_image(db=self.db, upload_file=image)
         user.image_id = image_model.id
         await self.update(user)
+        self.invalidate_user(user.id)
         return image_model
 
     async def delete_user_image(self, user: User) -> None:
@@ -47,6 +76,7 @@ class UsersCrud(BaseCRUD):
             old_image = await self.get(image_id, Image)
             await self.delete(old_image)
             await self.update(user)
+            self.invalidate_user(user.id)
 
     async def get_users(self, order_by: str = "name", order: str = "asc", search: str = None, page: int = 1, superusers_to_top: bool = False, only_superusers: bool = False, is_verified: bool = None,
                         page_size: int = 20) -> list[User]:
@@ -59,8 +89,7 @@ class UsersCrud(BaseCRUD):
         else:
             users = users.order_by(order_query)
         if search:
-            users = users.where(
-                or_(User.name.ilike(f"%{search}%"), User.email.ilike(f"%{search}%")))
+            users = users.where(search_filter(search, User.name, User.email))
         if only_superusers:
             users = users.where(User.is_superuser == True)
         if is_verified is not None:
@@ -80,46 +109,113 @@ class UsersCrud(BaseCRUD):
         user.name = user_data.name
         user.description = user_data.description
         if user_data.password:
-            async with get_user_manager_context(self.db) as user_manager:
+            async with get_user_db_context(self.db) as user_db, get_user_manager_context(user_db) as user_manager:
                 user.hashed_password = user_manager.password_helper.hash(
                     user_data.password)
         if user.email != user_data.email:
             user.email = user_data.email
             user.is_verified = False
             user = await self.update(user)
-            async with get_user_manager_context(self.db) as user_manager:
+            async with get_user_db_context(self.db) as user_db, get_user_manager_context(user_db) as user_manager:
                 await user_manager.request_verify(user)
         else:
             user = await self.update(user)
+        self.invalidate_user(user.id)
         return user
 
+    async def delete_user(self, user: User) -> None:
+        # user_hobbies удаляются вместе с пользователем, счетчики хобби уменьшаем вручную
+        await self.db.execute(update(Hobby).where(Hobby.id.in_(
+            select(UserHobby.hobby_id).where(UserHobby.user_id == user.id)
+        )).values(user_count=Hobby.user_count - 1))
+        await self.delete(user)
+        self.invalidate_user(user.id)
+        candidate_pool.invalidate(user.id)
+        scoring_profiles.invalidate(user.id)
+
     async def get_user_like(self, user: User, liked_user: User) -> UserLike:
         query = await self.db.execute(select(UserLike).where(UserLike.user_id == user.id).where(UserLike.liked_user_id == liked_user.id))
         return query.scalars().first()
 
-    async def set_user_like(self, user: User, liked_user: User, like: bool) -> UserLike:
-        user_like = await self.get_user_like(user, liked_user)
-        if user_like:
-            user_like.like = like
-            return await self.update(user_like)
-        return await self.create(UserLike(user_id=user.id, liked_user_id=liked_user.id, like=like))
-
-    async def check_match(self, user: User, liked_user: User) -> bool:
-        user_like = await self.get_user_like(user, liked_user)
-        if not user_like:
-            return False
-        liked_user_like = await self.get_user_like(liked_user, user)
-        if not liked_user_like:
-            return False
-        return user_like.like and liked_user_like.like
+    async def set_user_like(self, user: User, liked_user_id: uuid.UUID, like: bool) -> UserLikeSchema | None:
+        '''Ставит или меняет оценку одним запросом и сразу проверяет взаимный лайк.
+
+        Возвращает None, если оцениваемого пользователя не существует.
+        '''
+        candidate_pool.discard(user.id, liked_user_id)
+        upsert = insert(UserLike).values(
+            id=uuid.uuid4(), user_id=user.id, liked_user_id=liked_user_id, like=like)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[UserLike.user_id, UserLike.liked_user_id],
+            set_={'like': upsert.excluded.like, 'like_date': func.now()}
+        ).returning(UserLike.user_id, UserLike.liked_user_id, UserLike.like).cte('upsert')
+        reverse_like = select(UserLike.id).where(
+            UserLike.user_id == liked_user_id,
+            UserLike.liked_user_id == user.id,
+            UserLike.like == True
+        ).exists()
+        try:
+            # SELECT из CTE с INSERT должен выполняться на основной БД
+            query = await use_primary(self.db).execute(
+                select(upsert, and_(upsert.c.like, reverse_like).label('is_match')))
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            return None
+        return UserLikeSchema.model_validate(query.one(), from_attributes=True)
+
+    async def set_user_likes(self, user: User, swipes: List[Swipe]) -> List[UserLikeSchema]:
+        '''Записывает пачку оценок одним многострочным upsert и проверяет взаимные лайки.
+
+        Из нескольких оценок одного пользователя берётся последняя по времени.
+        Оценки, которые старше уже сохранённых, и оценки несуществующих
+        пользователей пропускаются. Возвращает только применённые оценки.
+        '''
+        now = datetime.now(timezone.utc)
+        latest = {}
+        for swipe in swipes:
+            if swipe.user_id == user.id:
+                continue
+            timestamp = swipe.timestamp if swipe.timestamp.tzinfo else swipe.timestamp.replace(tzinfo=timezone.utc)
+            timestamp = min(timestamp, now)
+            if swipe.user_id not in latest or latest[swipe.user_id][1] < timestamp:
+                latest[swipe.user_id] = (swipe.like, timestamp)
+        if not latest:
+            return []
+        query = await self.db.execute(select(User.id).where(User.id.in_(latest.keys())))
+        existing_ids = query.scalars().all()
+        if not existing_ids:
+            return []
+        for liked_user_id in existing_ids:
+            candidate_pool.discard(user.id, liked_user_id)
+
+        upsert = insert(UserLike).values([
+            dict(id=uuid.uuid4(), user_id=user.id, liked_user_id=liked_user_id,
+                 like=latest[liked_user_id][0], like_date=latest[liked_user_id][1])
+            for liked_user_id in existing_ids
+        ])
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[UserLike.user_id, UserLike.liked_user_id],
+            set_={'like': upsert.excluded.like, 'like_date': upsert.excluded.like_date},
+            where=UserLike.like_date < upsert.excluded.like_date
+        ).returning(UserLike.user_id, UserLike.liked_user_id, UserLike.like).cte('upsert')
+        reverse_like = select(UserLike.id).where(
+            UserLike.user_id == upsert.c.liked_user_id,
+            UserLike.liked_user_id == user.id,
+            UserLike.like == True
+        ).exists()
+        # SELECT из CTE с INSERT должен выполняться на основной БД
+        query = await use_primary(self.db).execute(
+            select(upsert, and_(upsert.c.like, reverse_like).label('is_match')))
+        await self.db.commit()
+        return [UserLikeSchema.model_validate(row, from_attributes=True) for row in query.all()]
 
     async def get_matches(self, user: User, page: int = 1, page_size: int = 20) -> list[UserLikeFull]:
         user_id = user.id
         end = page * page_size
         start = end - page_size
         query = await self.db.execute(
-            select(User)
-            .join(UserLike, UserLike.liked_user_id == User.id)
+            select(UserLike.liked_user_id)
             .where(
                 UserLike.user_id == user_id,
                 UserLike.like == True,
@@ -131,50 +227,108 @@ class UsersCrud(BaseCRUD):
                 )
             )
             .order_by(UserLike.like_date.desc())
-            .slice(start, end).options(*self.selectinload_user_options())
+            .slice(start, end)
         )
-        return [UserLikeFull(is_match=True, liked_user=user) for user in query.scalars().all()]
+        profiles = await self.get_user_profiles(query.scalars().all())
+        return [UserLikeFull(is_match=True, liked_user=profile) for profile in profiles]
 
     async def get_user_likes(self, user: User, page: int = 1, page_size: int = 20) -> list[UserLikeFull]:
         user_id = user.id
         end = page * page_size
         start = end - page_size
-        subquery = select(UserLike.like).where(
-            UserLike.user_id == User.id, UserLike.liked_user_id == user_id, UserLike.like == True).correlate(User).as_scalar()
+        reverse_like = aliased(UserLike)
+        is_match = select(reverse_like.id).where(
+            reverse_like.user_id == UserLike.liked_user_id,
+            reverse_like.liked_user_id == user_id,
+            reverse_like.like == True
+        ).exists()
         query = await self.db.execute(
-            select(User, subquery)
-            .join(UserLike, UserLike.liked_user_id == User.id)
+            select(UserLike.liked_user_id, is_match)
             .where(UserLike.user_id == user_id)
-            .options(*self.selectinload_user_options())
             .order_by(UserLike.like_date.desc())
             .slice(start, end)
         )
-        return [UserLikeFull(is_match=is_match is not None, liked_user=user) for user, is_match in query.all()]
+        likes = query.all()
+        profiles = {profile['id']: profile for profile in await self.get_user_profiles([liked_user_id for liked_user_id, _ in likes])}
+        return [UserLikeFull(is_match=is_match, liked_user=profiles[liked_user_id])
+                for liked_user_id, is_match in likes if liked_user_id in profiles]
 
-    async def get_random_user(self, not_user_id: uuid.UUID) -> User:
-        query = select(User).where(User.id != not_user_id, User.image_id != None).order_by(
-            func.random()).options(*self.selectinload_user_options())
-        result = await self.db.execute(query)
-        return result.scalars().first()
+    async def get_random_user_ids(self, query, limit: int) -> List[uuid.UUID]:
+        '''Случайная выборка id по индексу первичного ключа вместо ORDER BY random()'''
+        pivot = uuid.uuid4()
+        result = await self.db.execute(query.where(User.id >= pivot).order_by(User.id).limit(limit))
+        ids = list(result.scalars().all())
+        if len(ids) < limit:
+            result = await self.db.execute(query.where(User.id < pivot).order_by(User.id).limit(limit - len(ids)))
+            ids += result.scalars().all()
+        return ids
 
-    async def get_recommended_user(self, user: User, hobbies_ids: List[uuid.UUID], institutions_ids: List[uuid.UUID]):
-        query = select(User).order_by(func.random())
+    async def get_candidate_ids(self, user: User, hobbies_ids: List[uuid.UUID], institutions_ids: List[uuid.UUID], limit: int) -> List[uuid.UUID]:
+        '''Кандидаты в рекомендации: сначала не лайкнутые подходящие под фильтры, затем любые подходящие, затем любые'''
+        query = select(User.id).where(User.id != user.id, User.image_id != None)
+        filtered_query = query
         if len(hobbies_ids) >= 1:
-            query = query.join(UserHobby, User.id == UserHobby.user_id).where(
-                UserHobby.hobby_id.in_(hobbies_ids))
+            filtered_query = filtered_query.where(
+                select(UserHobby.user_id).where(
+                    UserHobby.user_id == User.id,
+                    UserHobby.hobby_id.in_(hobbies_ids)
+                ).exists()
+            )
         if len(institutions_ids) >= 1:
-            query = query.where(User.institution_id.in_(institutions_ids))
-        query = query.where(User.id != user.id, User.image_id != None)
+            filtered_query = filtered_query.where(
+                User.institution_id.in_(institutions_ids))
         liked_users_subquery = select(UserLike.liked_user_id).where(
-            UserLike.user_id == user.id).as_scalar()
-        rec_query = query.where(User.id.notin_(liked_users_subquery))
-        rec_query = query.options(*self.selectinload_user_options())
-        rec_result = await self.db.execute(rec_query)
-        recommended_user = rec_result.scalars().first()
-        if recommended_user is None:
-            rec_query = query
-            rec_result = await self.db.execute(rec_query)
-            recommended_user = rec_result.scalars().first()
-            if recommended_user is None:
-                return await self.get_random_user(user.id)
-        return recommended_user
+            UserLike.user_id == user.id)
+        for candidates_query in (
+            filtered_query.where(User.id.notin_(liked_users_subquery)),
+            filtered_query,
+            query
+        ):
+            ids = await self.get_random_user_ids(candidates_query, limit)
+            if ids:
+                return ids
+        return []
+
+    async def get_random_user(self, not_user_id: uuid.UUID) -> User:
+        ids = await self.get_random_user_ids(
+            select(User.id).where(User.id != not_user_id, User.image_id != None), 1)
+        if not ids:
+            return None
+        return await self.get_user_by_id(ids[0])
+
+    async def get_scoring_profiles(self, users_ids: List[uuid.UUID]):
+        result = await self.db.execute(
+            select(
+                User.id,
+                User.institution_id,
+                Institution.city_id,
+                func.array_remove(func.array_agg(UserHobby.hobby_id), None)
+            )
+            .outerjoin(Institution, Institution.id == User.institution_id)
+            .outerjoin(UserHobby, UserHobby.user_id == User.id)
+            .where(User.id.in_(users_ids))
+            .group_by(User.id, Institution.city_id)
+        )
+        return result.all()
+
+    async def get_recommended_users(self, user: User, hobbies_ids: List[uuid.UUID], institutions_ids: List[uuid.UUID], page_size: int = 10,
+                                    scored: bool = False) -> List[dict]:
+        '''Возвращает до page_size разных рекомендованных пользователей одним запросом.
+
+        scored ранжирует выборку кандидатов по сходству хобби (Жаккар) и совпадению учебного заведения и города.
+        '''
+        key = (frozenset(hobbies_ids), frozenset(institutions_ids), scored)
+
+        async def loader(limit: int) -> List[uuid.UUID]:
+            if not scored:
+                return await self.get_candidate_ids(user=user, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids, limit=limit)
+            sample = await self.get_candidate_ids(user=user, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids,
+                                                  limit=limit * scoring_sample_factor)
+            ranked = await scoring_profiles.rank(user.id, sample, self.get_scoring_profiles)
+            return ranked[:limit]
+        ids = await candidate_pool.take(user.id, key, page_size, loader, shuffle=not scored)
+        return await self.get_user_profiles(ids)
+
+    async def get_recommended_user(self, user: User, hobbies_ids: List[uuid.UUID], institutions_ids: List[uuid.UUID], scored: bool = False):
+        users = await self.get_recommended_users(user=user, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids, page_size=1, scored=scored)
+        return users[0] if users else None
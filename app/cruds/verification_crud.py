@@ -10,7 +10,10 @@ from models.verification import VerificationRequest
 from models.locations import Institution
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from utilities.files import save_image
+from utilities.files import save_images
+from utilities.auth import user_cache
+from utilities.profiles import profile_cache
+from utilities.recommendations import scoring_profiles
 
 
 class VerificationCrud(BaseCRUD):
@@ -44,8 +47,7 @@ class VerificationCrud(BaseCRUD):
     async def create_verification_request(
         self, institution_id: uuid.UUID, real_photo: UploadFile, id_photo: UploadFile, user: User, name: str, birthdate: datetime
     ) -> VerificationRequest:
-        real_photo_model = await save_image(db=self.db, upload_file=real_photo)
-        id_photo_model = await save_image(db=self.db, upload_file=id_photo)
+        real_photo_model, id_photo_model = await save_images(db=self.db, upload_files=[real_photo, id_photo])
         return await self.create(
             VerificationRequest(
                 user_id=user.id,
@@ -66,5 +68,8 @@ class VerificationCrud(BaseCRUD):
             user.birthdate = verification_request.birthdate
             user.institution_id = verification_request.institution_id
         await self.update(user)
+        scoring_profiles.invalidate(user.id)
+        user_cache.invalidate(user.id)
+        profile_cache.invalidate(user.id)
         request = await self.update(verification_request)
         return await self.get_verification_request(request.id)
@@ -1,8 +1,13 @@
 import contextlib
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy import Select, event
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.sql.dml import UpdateBase
+from starlette.requests import HTTPConnection
 from os import getenv
+from db.metrics import db_metrics, get_route_name
 DATABASE_URL = f'postgresql+asyncpg://{getenv("POSTGRES_USER")}:{getenv("POSTGRES_PASSWORD")}@{getenv("POSTGRES_HOST")}:5432/{getenv("POSTGRES_DB")}'
 
 
@@ -10,17 +15,70 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(DATABASE_URL)
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+def create_engine(url: str, name: str) -> AsyncEngine:
+    '''Создает движок с настройками пула из переменных окружения DB_*'''
+    metrics = db_metrics.pool(name)
+    url = make_url(url).update_query_dict({
+        'prepared_statement_cache_size': getenv('DB_PREPARED_STATEMENT_CACHE_SIZE', '100')
+    })
+    engine = create_async_engine(
+        url,
+        poolclass=metrics.pool_class(),
+        pool_size=int(getenv('DB_POOL_SIZE', 5)),
+        max_overflow=int(getenv('DB_MAX_OVERFLOW', 10)),
+        pool_timeout=float(getenv('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(getenv('DB_POOL_RECYCLE', -1)),
+        pool_pre_ping=getenv('DB_POOL_PRE_PING', 'false').lower() == 'true',
+        connect_args={
+            'statement_cache_size': int(getenv('DB_STATEMENT_CACHE_SIZE', 100)),
+        },
+    )
+    metrics.engine = engine
+    return engine
 
 
-async def create_db_and_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+engine = create_engine(DATABASE_URL, name='primary')
+READ_DATABASE_URL = getenv('READ_DATABASE_URL')
+read_engine = create_engine(READ_DATABASE_URL, name='replica') if READ_DATABASE_URL else None
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
-        yield session
+class RoutingSession(Session):
+    '''Направляет SELECT на реплику, а запись - на основную БД.
+
+    После первой записи сессия до конца работы читает только из основной
+    БД, чтобы запрос видел собственные изменения. use_primary включает это
+    поведение заранее.
+    '''
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['use_primary'] = True
+        if self.info.get('use_primary') or not isinstance(clause, Select):
+            return engine.sync_engine
+        return read_engine.sync_engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def receive_after_flush(session, flush_context):
+    session.info['use_primary'] = True
+
+
+def use_primary(session: AsyncSession) -> AsyncSession:
+    session.sync_session.info['use_primary'] = True
+    return session
+
+
+if read_engine is None:
+    async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+else:
+    async_session_maker = async_sessionmaker(
+        sync_session_class=RoutingSession, expire_on_commit=False)
+
+
+async def get_async_session(connection: HTTPConnection = None) -> AsyncGenerator[AsyncSession, None]:
+    with db_metrics.track_session(get_route_name(connection)):
+        async with async_session_maker() as session:
+            yield session
+
 
 get_async_session_context = contextlib.asynccontextmanager(get_async_session)
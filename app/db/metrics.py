@@ -0,0 +1,110 @@
+from bisect import bisect_left
+import contextlib
+import time
+from typing import Dict, List
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import HTTPConnection
+
+
+default_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = default_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict:
+        buckets = {}
+        total = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            buckets[str(bound)] = total
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'buckets': buckets
+        }
+
+
+class PoolMetrics:
+    '''Состояние пула соединений одного движка и время ожидания соединения'''
+
+    def __init__(self, name: str):
+        self.name = name
+        self.engine = None
+        self.acquire_wait = Histogram()
+
+    def pool_class(self):
+        metrics = self
+
+        class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+            def _do_get(self):
+                started = time.perf_counter()
+                try:
+                    return super()._do_get()
+                finally:
+                    metrics.acquire_wait.observe(
+                        time.perf_counter() - started)
+
+        return InstrumentedQueuePool
+
+    def snapshot(self) -> Dict:
+        pool = self.engine.pool if self.engine else None
+        return {
+            'size': pool.size() if pool else 0,
+            'checked_out': pool.checkedout() if pool else 0,
+            'idle': pool.checkedin() if pool else 0,
+            'overflow': pool.overflow() if pool else 0,
+            'acquire_wait_seconds': self.acquire_wait.snapshot()
+        }
+
+
+class DBMetrics:
+    def __init__(self):
+        self.pools: Dict[str, PoolMetrics] = {}
+        self.session_hold: Dict[str, Histogram] = {}
+
+    def pool(self, name: str) -> PoolMetrics:
+        if name not in self.pools:
+            self.pools[name] = PoolMetrics(name)
+        return self.pools[name]
+
+    @contextlib.contextmanager
+    def track_session(self, route: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if route not in self.session_hold:
+                self.session_hold[route] = Histogram()
+            self.session_hold[route].observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Dict:
+        return {
+            'pools': {name: pool.snapshot() for name, pool in self.pools.items()},
+            'session_hold_seconds': {
+                route: histogram.snapshot() for route, histogram in self.session_hold.items()
+            }
+        }
+
+
+def get_route_name(connection: HTTPConnection | None) -> str:
+    if connection is None:
+        return 'background'
+    route = connection.scope.get('route')
+    return getattr(route, 'path', connection.url.path)
+
+
+db_metrics = DBMetrics()
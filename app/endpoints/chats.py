@@ -1,13 +1,14 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, WebSocket, WebSocketDisconnect, WebSocketException
-from utilities.chats import set_chat_info
+from utilities.chats import can_read_chat, chat_members_cache, get_chats_info, set_chat_info
 from utilities.websockets import get_user_from_cookie
 from users_controller import current_active_user
 from db.db import get_async_session
 from cruds.chats_crud import ChatsCrud
 from uuid import UUID
-from schemas.chats import Chat, ChatWithUsers, Message
-from notifier import Notifier, get_notifier
+from schemas.chats import Chat, ChatWithUsers, Message, MessagesPage
+from utilities.pagination import decode_cursor, encode_cursor
+from notifier import NotifierNamespace, get_notifier
 
 api_router = APIRouter(tags=["chats"], prefix="/chats")
 
@@ -20,8 +21,8 @@ async def get_chats(
     current_user=Depends(current_active_user)
 ):
     '''Возвращает список чатов пользователя.'''
-    chats = await ChatsCrud(db).get_user_chats(user_id=current_user.id, page=page, search_query=query)
-    return [set_chat_info(chat=chat, unread_count=unread_count) for chat, unread_count in chats]
+    chats = await ChatsCrud(db).get_user_chats(user_id=current_user.id, page=page, search_query=query, load_users=False)
+    return await get_chats_info(db, chats)
 
 
 @api_router.post("", response_model=Chat)
@@ -44,6 +45,7 @@ async def delete_chat(chat_id: UUID = Path(..., description='ID чата'), db=D
         raise HTTPException(
             status_code=403, detail='У вас нет доступа к этому чату')
     await ChatsCrud(db).delete(db_chat)
+    chat_members_cache.invalidate(chat_id)
 
 
 @api_router.get("/user/{user_id}", response_model=ChatWithUsers)
@@ -75,7 +77,7 @@ async def get_chat(chat_id: UUID = Path(..., description='ID чата'), read: b
 
 
 @api_router.post("/{chat_id}/messages", response_model=Message)
-async def send_message(content: str, chat_id: UUID = Path(..., description='ID чата'), db=Depends(get_async_session), current_user=Depends(current_active_user), notifier: Notifier = Depends(get_notifier('chats'))):
+async def send_message(content: str, chat_id: UUID = Path(..., description='ID чата'), db=Depends(get_async_session), current_user=Depends(current_active_user), notifier: NotifierNamespace = Depends(get_notifier('chats'))):
     '''Отправляет сообщение в чат.'''
     db_chat = await ChatsCrud(db).get_chat(chat_id=chat_id)
     if not db_chat:
@@ -126,36 +128,68 @@ async def get_messages(chat_id: UUID = Path(..., description='ID чата'), pag
     return await ChatsCrud(db).get_messages(chat_id=chat_id, page=page)
 
 
+@api_router.get("/{chat_id}/messages/cursor", response_model=MessagesPage)
+async def get_messages_by_cursor(
+    chat_id: UUID = Path(..., description='ID чата'),
+    before: str = Query(None, description='Курсор: сообщения старше'),
+    after: str = Query(None, description='Курсор: сообщения новее'),
+    page_size: int = Query(20, ge=1, le=100),
+    db=Depends(get_async_session),
+    current_user=Depends(current_active_user)
+):
+    '''Возвращает страницу сообщений чата по курсору, от новых к старым.'''
+    if before and after:
+        raise HTTPException(
+            status_code=422, detail='Нельзя указывать before и after одновременно')
+    can_read = await can_read_chat(chat_id=chat_id, user_id=current_user.id)
+    if can_read is None:
+        raise HTTPException(status_code=404, detail='Чат не найден')
+    if not can_read:
+        raise HTTPException(
+            status_code=403, detail='У вас нет доступа к этому чату')
+    messages = await ChatsCrud(db).get_messages_by_cursor(
+        chat_id=chat_id,
+        before=decode_cursor(before) if before else None,
+        after=decode_cursor(after) if after else None,
+        page_size=page_size
+    )
+    page = MessagesPage(items=messages)
+    if messages:
+        page.prev_cursor = encode_cursor(messages[0].creation_date, messages[0].id)
+        if len(messages) == page_size or after:
+            page.next_cursor = encode_cursor(messages[-1].creation_date, messages[-1].id)
+    return page
+
+
 @api_router.websocket("/{chat_id}/messages/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
     chat_id: UUID = Path(..., description='ID чата'),
-    current_user=Depends(get_user_from_cookie),
-    db=Depends(get_async_session)
+    current_user=Depends(get_user_from_cookie)
 ):
     if not current_user:
         raise WebSocketException(code=403, reason="Access denied")
-    chat = await ChatsCrud(db).get_chat(chat_id=chat_id)
-    if not chat:
+    can_read = await can_read_chat(chat_id=chat_id, user_id=current_user.id)
+    if can_read is None:
         raise WebSocketException(code=404, reason="Chat not found")
-    if not chat.can_read(user_id=current_user.id):
+    if not can_read:
         raise WebSocketException(code=403, reason="Access denied")
-    notifier: Notifier = get_notifier(f'chat_{chat_id}')()
+    notifier: NotifierNamespace = get_notifier(f'chat_{chat_id}')()
     try:
         await notifier.connect(user_id=current_user.id, websocket=websocket)
         while True:
-            await websocket.receive()
+            await websocket.receive_text()
     except WebSocketDisconnect:
-        notifier.remove(user_id=current_user.id, websocket=websocket)
+        await notifier.remove(user_id=current_user.id, websocket=websocket)
 
 
 @api_router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, current_user=Depends(get_user_from_cookie), notifier: Notifier = Depends(get_notifier('chats'))):
+async def websocket_endpoint(websocket: WebSocket, current_user=Depends(get_user_from_cookie), notifier: NotifierNamespace = Depends(get_notifier('chats'))):
     if not current_user:
         raise WebSocketException(code=403, reason="Access denied")
     try:
         await notifier.connect(user_id=current_user.id, websocket=websocket)
         while True:
-            await websocket.receive()
+            await websocket.receive_text()
     except WebSocketDisconnect:
-        notifier.remove(user_id=current_user.id, websocket=websocket)
+        await notifier.remove(user_id=current_user.id, websocket=websocket)
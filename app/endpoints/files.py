@@ -1,20 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Query, Request
 from fastapi.responses import FileResponse
-from utilities.files import get_image_path
-from db.db import get_async_session
+from utilities.files import get_image_variant
+from utilities.images import ImageDecodeError, ImageFormat, ImageSize, image_formats, negotiate_format
+from utilities.responses import immutable_file_response
 import uuid
-from cruds.file_cruds import FilesCRUD
 
 api_router = APIRouter(tags=["files"])
 
 
 @api_router.get("/images/{image_id}", response_class=FileResponse)
 async def get_app_image(
+    request: Request,
     image_id: uuid.UUID = Path(...),
-    db=Depends(get_async_session),
+    size: ImageSize = Query(ImageSize.full),
+    image_format: ImageFormat = Query(None, alias='format'),
 ):
-    files_crud = FilesCRUD(db)
-    image = await files_crud.get_image_by_id(image_id=image_id)
-    if not image:
+    '''Отдает изображение нужного размера (thumb, medium, full) прямо с диска.
+
+    Без параметра format формат выбирается по заголовку Accept. Путь к файлу
+    определяется идентификатором, поэтому БД не используется, а ответ можно
+    кэшировать бессрочно.
+    '''
+    headers = {}
+    if image_format is None:
+        format = negotiate_format(request.headers.get('accept', ''), size.value)
+        headers['vary'] = 'Accept'
+    else:
+        format = image_format.value
+    try:
+        image_path = await get_image_variant(image_id, size.value, format)
+    except ImageDecodeError:
+        raise HTTPException(status_code=422, detail="поврежденное изображение")
+    response = image_path and await immutable_file_response(
+        request, image_path, image_formats[format][1], headers)
+    if response is None:
         raise HTTPException(status_code=404, detail="Изображение не найдено")
-    return FileResponse(await get_image_path(image=image))
+    return response
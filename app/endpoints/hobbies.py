@@ -42,7 +42,7 @@ async def delete_my_hobby(hobby_id: uuid.UUID, db=Depends(get_async_session), cu
         raise HTTPException(status_code=404, detail="Хобби не найдено")
     user_hobby = await HobbiesCrud(db).get_user_hobby(user=current_user, hobby=hobby)
     if user_hobby:
-        await HobbiesCrud(db).delete(user_hobby)
+        await HobbiesCrud(db).delete_user_hobby(user_hobby)
 
 
 @api_router.get("/all", response_model=List[HobbyWithLike])
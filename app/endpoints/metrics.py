@@ -0,0 +1,19 @@
+from typing import Dict
+from fastapi import APIRouter, Depends
+from db.metrics import db_metrics
+from notifier import notifier
+from users_controller import current_superuser
+
+api_router = APIRouter(prefix="/metrics", tags=["metrics"], dependencies=[Depends(current_superuser)])
+
+
+@api_router.get("/db")
+async def get_db_metrics():
+    '''Состояние пулов соединений, время ожидания соединения и гистограмма времени удержания сессии по эндпоинтам.'''
+    return db_metrics.snapshot()
+
+
+@api_router.get("/notifier", response_model=Dict[str, int])
+async def get_notifier_metrics():
+    '''Количество открытых сокетов по пространствам имён.'''
+    return notifier.connection_counts()
@@ -1,7 +1,7 @@
 from typing import List
 import uuid
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, WebSocket, WebSocketDisconnect, WebSocketException
-from notifier import Notifier, get_notifier
+from notifier import NotifierNamespace, get_notifier
 from utilities.websockets import get_user_from_cookie
 from users_controller import current_active_user
 from db.db import get_async_session
@@ -23,13 +23,13 @@ async def websocket_endpoint(
 ):
     if not current_user:
         raise WebSocketException(code=403, reason="Access denied")
-    notifier: Notifier = get_notifier(f'notifications')()
+    notifier: NotifierNamespace = get_notifier(f'notifications')()
     try:
         await notifier.connect(user_id=current_user.id, websocket=websocket)
         while True:
-            await websocket.receive()
+            await websocket.receive_text()
     except WebSocketDisconnect:
-        notifier.remove(user_id=current_user.id, websocket=websocket)
+        await notifier.remove(user_id=current_user.id, websocket=websocket)
 
 
 @api_router.get("/unread", response_model=List[Notification])
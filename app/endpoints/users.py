@@ -1,11 +1,11 @@
 from typing import List, Literal, Union
 import uuid
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
-from utilities.notifications import send_notification
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, UploadFile
+from utilities.notifications import send_notification, send_notifications
 from cruds.institutions_crud import InstitutionsCrud
 from cruds.hobbies_crud import HobbiesCrud
 from cruds.users_cruds import UsersCrud
-from schemas.users import UserLike, UserRead, UserReadInstitution, UserReadShort,  UserUpdate, UserReadWithEmail
+from schemas.users import Swipe, UserLike, UserRead, UserReadInstitution, UserReadShort,  UserUpdate, UserReadWithEmail
 from schemas.files import ImageInfo
 from users_controller import current_active_user, current_superuser
 from db.db import get_async_session
@@ -81,47 +81,43 @@ async def get_user_me(
     db=Depends(get_async_session),
     current_user: User = Depends(current_active_user)
 ):
-    return await UsersCrud(db).get_user_by_id(current_user.id)
+    profile = await UsersCrud(db).get_user_profile(current_user.id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return profile
+
+
+async def check_recommendation_filters(db, hobbies_ids: List[uuid.UUID], institutions_ids: List[uuid.UUID]):
+    if hobbies_ids and len(await HobbiesCrud(db).get_hobbies_by_ids(hobbies_ids)) != len(set(hobbies_ids)):
+        raise HTTPException(status_code=404, detail="Хобби не найдено")
+    if institutions_ids and len(await InstitutionsCrud(db).get_institutions_by_ids(institutions_ids)) != len(set(institutions_ids)):
+        raise HTTPException(404, "Образовательное учреждение не найдено")
 
 
 @api_router.get("/recommended", response_model=UserReadShort)
 async def get_recommended(
     hobbies_ids: List[uuid.UUID] = Query([]),
     institutions_ids: List[uuid.UUID] = Query([]),
+    scored: bool = Query(False, description='Ранжировать по общим хобби, учебному заведению и городу'),
     db=Depends(get_async_session),
     current_user: User = Depends(current_active_user)
 ):
-    for hobby_id in hobbies_ids:
-        hobby = await HobbiesCrud(db).get_hobby(hobby_id)
-        if not hobby:
-            raise HTTPException(status_code=404, detail="Хобби не найдено")
-
-    for institution_id in institutions_ids:
-        institution = await InstitutionsCrud(db).get_institution(institution_id=institution_id)
-        if not institution:
-            raise HTTPException(404, "Образовательное учреждение не найдено")
-    return await UsersCrud(db).get_recommended_user(user=current_user, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids)
+    await check_recommendation_filters(db=db, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids)
+    return await UsersCrud(db).get_recommended_user(user=current_user, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids, scored=scored)
 
 
 @api_router.get("/recommended/list", response_model=List[UserReadShort])
 async def get_recommended_list(
     hobbies_ids: List[uuid.UUID] = Query([]),
     institutions_ids: List[uuid.UUID] = Query([]),
+    page_size: int = Query(10, ge=1, le=50),
+    scored: bool = Query(False, description='Ранжировать по общим хобби, учебному заведению и городу'),
     db=Depends(get_async_session),
     current_user: User = Depends(current_active_user)
 ):
-    for hobby_id in hobbies_ids:
-        hobby = await HobbiesCrud(db).get_hobby(hobby_id)
-        if not hobby:
-            raise HTTPException(status_code=404, detail="Хобби не найдено")
-
-    for institution_id in institutions_ids:
-        institution = await InstitutionsCrud(db).get_institution(institution_id=institution_id)
-        if not institution:
-            raise HTTPException(404, "Образовательное учреждение не найдено")
-    return [
-        await UsersCrud(db).get_recommended_user(user=current_user, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids) for _ in range(10)
-    ]
+    '''Возвращает page_size разных рекомендованных пользователей.'''
+    await check_recommendation_filters(db=db, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids)
+    return await UsersCrud(db).get_recommended_users(user=current_user, hobbies_ids=hobbies_ids, institutions_ids=institutions_ids, page_size=page_size, scored=scored)
 
 
 @api_router.get("/{user_id}", response_model=Union[UserReadWithEmail, UserRead])
@@ -144,21 +140,17 @@ async def like_user(
     db=Depends(get_async_session),
     current_user: User = Depends(current_active_user)
 ):
-    users_crud = UsersCrud(db)
-    user = await users_crud.get_user_by_id(user_id)
-    if user is None:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    if user.id == current_user.id:
+    if user_id == current_user.id:
         raise HTTPException(
             status_code=400, detail="Нельзя лайкнуть самого себя")
-    user_like = await users_crud.set_user_like(user=current_user, liked_user=user, like=True)
-    like_info = UserLike.model_validate(user_like, from_attributes=True)
-    like_info.is_match = await users_crud.check_match(user=current_user, liked_user=user)
+    like_info = await UsersCrud(db).set_user_like(user=current_user, liked_user_id=user_id, like=True)
+    if like_info is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
     if like_info.is_match:
         await send_notification(
-            user_id=user.id,
-            title="Новый лайк",
-            text=f"Пользователь {current_user.name} лайкнул вас в ответ",
+            user_id=user_id,
+            header="Новый лайк",
+            message=f"Пользователь {current_user.name} лайкнул вас в ответ",
             db=db
         )
     return like_info
@@ -170,17 +162,37 @@ async def dislike_user(
     db=Depends(get_async_session),
     current_user: User = Depends(current_active_user)
 ):
-    users_crud = UsersCrud(db)
-    user = await users_crud.get_user_by_id(user_id)
-    if user is None:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    if user.id == current_user.id:
+    if user_id == current_user.id:
         raise HTTPException(
             status_code=400, detail="Нельзя дизлайкнуть самого себя")
-    user_like = await users_crud.set_user_like(user=current_user, liked_user=user, like=False)
+    user_like = await UsersCrud(db).set_user_like(user=current_user, liked_user_id=user_id, like=False)
+    if user_like is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
     return user_like
 
 
+@api_router.post("/swipes", response_model=List[UserLike])
+async def swipe_users(
+    swipes: List[Swipe] = Body(..., max_length=500),
+    db=Depends(get_async_session),
+    current_user: User = Depends(current_active_user)
+):
+    '''Пакетная запись лайков и дизлайков, накопленных клиентом.
+
+    Возвращает применённые оценки с признаком взаимного лайка.
+    '''
+    likes_info = await UsersCrud(db).set_user_likes(user=current_user, swipes=swipes)
+    await send_notifications([
+        dict(
+            user_id=like_info.liked_user_id,
+            header="Новый лайк",
+            message=f"Пользователь {current_user.name} лайкнул вас в ответ"
+        )
+        for like_info in likes_info if like_info.is_match
+    ], db=db)
+    return likes_info
+
+
 @api_router.get("", response_model=List[UserReadWithEmail])
 async def get_users(
     search: str = None,
@@ -215,4 +227,4 @@ async def delete_user(
     user = await users_crud.get_user_by_id(user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    await users_crud.delete(user)
+    await users_crud.delete_user(user)
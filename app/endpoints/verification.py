@@ -2,15 +2,14 @@ from typing import List
 import uuid
 from fastapi import APIRouter, Depends, File, HTTPException,  UploadFile
 from fastapi.params import Query
-from fastapi_mail import FastMail, MessageSchema, MessageType
 from utilities.notifications import send_notification
-from notifier import Notifier, get_notifier
+from notifier import NotifierNamespace, get_notifier
 from cruds.verification_crud import VerificationCrud
 from cruds.institutions_crud import InstitutionsCrud
 from schemas.verification import CreateVerificationRequest, VerificationRequest
 from users_controller import current_superuser, current_active_user
 from db.db import get_async_session
-from mail.conf import conf
+from mail.outbox import send_mail
 api_router = APIRouter(prefix="/verification", tags=["verification"])
 
 
@@ -45,7 +44,7 @@ async def create_verification_request(
     id_photo:  UploadFile = File(
         default=..., description='Фото документа пользователя'),
     db=Depends(get_async_session),
-    current_user=Depends(current_active_user), notifier: Notifier = Depends(get_notifier('chats'))
+    current_user=Depends(current_active_user), notifier: NotifierNamespace = Depends(get_notifier('chats'))
 ):
     has_active_request = await VerificationCrud(db).last_active_verification_request(user=current_user)
     if has_active_request:
@@ -90,18 +89,13 @@ async def update_verification_request(verification_request_id: uuid.UUID, approv
         message=message_text,
         db=db,
     )
-    message = MessageSchema(
+    await send_mail(
+        db,
         subject='Верификация аккаунта',
         recipients=[request.user.email],
         template_body={
                 'title': message_title,
                 'text': f'''<p>Здравствуйте, {request.user.name}</p><p>{message_text}</p>'''
-        },
-        subtype=MessageType.html
+        }
     )
-    try:
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name='default.html')
-    except Exception as e:
-        raise HTTPException(500, "Ошибка отправки сообщения")
     return request
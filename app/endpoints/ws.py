@@ -0,0 +1,62 @@
+import json
+from uuid import UUID
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, WebSocketException
+from notifier import notifier
+from utilities.websockets import get_user_from_cookie
+from utilities.chats import can_read_chat
+
+api_router = APIRouter(tags=["ws"])
+
+static_topics = {'chats', 'notifications'}
+chat_topic_prefix = 'chat_'
+
+
+async def can_subscribe(topic: str, user_id: UUID) -> bool:
+    if topic in static_topics:
+        return True
+    if not topic.startswith(chat_topic_prefix):
+        return False
+    try:
+        chat_id = UUID(topic[len(chat_topic_prefix):])
+    except ValueError:
+        return False
+    return bool(await can_read_chat(chat_id=chat_id, user_id=user_id))
+
+
+@api_router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, current_user=Depends(get_user_from_cookie)):
+    '''Единый сокет для чатов, сообщений чатов и уведомлений.
+
+    Клиент управляет подписками кадрами {"action": "subscribe" | "unsubscribe", "topic": "chats" | "notifications" | "chat_<chat_id>"},
+    события сервера приходят в виде {"topic": ..., "data": ...}.
+    '''
+    if not current_user:
+        raise WebSocketException(code=403, reason="Access denied")
+    connection = await notifier.accept(websocket, multiplexed=True)
+    try:
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+                action, topic = frame['action'], str(frame['topic'])
+            except (ValueError, KeyError, TypeError):
+                connection.put(json.dumps({'error': 'Invalid frame'}))
+                continue
+            if action == 'subscribe':
+                if not await can_subscribe(topic=topic, user_id=current_user.id):
+                    connection.put(json.dumps(
+                        {'topic': topic, 'error': 'Access denied'}))
+                    continue
+                await notifier.subscribe(topic, current_user.id, connection)
+                connection.put(json.dumps(
+                    {'topic': topic, 'action': 'subscribed'}))
+            elif action == 'unsubscribe':
+                await notifier.unsubscribe(topic, current_user.id, websocket)
+                connection.put(json.dumps(
+                    {'topic': topic, 'action': 'unsubscribed'}))
+            else:
+                connection.put(json.dumps(
+                    {'topic': topic, 'error': 'Unknown action'}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await notifier.disconnect(current_user.id, connection)
@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+from email.utils import formataddr
+from os import getenv
+from typing import Dict, List
+import uuid
+from fastapi_mail import ConnectionConfig, MessageSchema, MessageType
+from fastapi_mail.connection import Connection
+from fastapi_mail.fastmail import email_dispatched
+from fastapi_mail.msg import MailMsg
+from sqlalchemy.ext.asyncio import AsyncSession
+from cruds.mail_crud import MailCrud
+from db.db import async_session_maker, use_primary
+from mail.conf import conf
+from models.mail import OutgoingMail
+
+
+class MailSender:
+    '''Собирает письма из outgoing_mails и отправляет их через одно SMTP-соединение'''
+
+    def __init__(self, config: ConnectionConfig):
+        self.config = config
+        self.templates = config.template_engine() if config.TEMPLATE_FOLDER else None
+
+    def render(self, mail: OutgoingMail) -> MessageSchema:
+        if self.templates and mail.template_name:
+            body = self.templates.get_template(
+                mail.template_name).render(**mail.template_body)
+        else:
+            body = mail.template_body.get('text', '')
+        return MessageSchema(
+            subject=mail.subject,
+            recipients=mail.recipients,
+            body=body,
+            subtype=MessageType.html
+        )
+
+    async def prepare(self, mail: OutgoingMail):
+        message = await MailMsg(self.render(mail)).as_string()
+        del message['From']
+        if self.config.MAIL_FROM_NAME is not None:
+            message['From'] = formataddr((self.config.MAIL_FROM_NAME, self.config.MAIL_FROM))
+        else:
+            message['From'] = self.config.MAIL_FROM
+        return message
+
+    async def send(self, mails: List[OutgoingMail]) -> Dict[uuid.UUID, str | None]:
+        '''Отправляет письма, возвращает id -> текст ошибки (None, если письмо ушло)'''
+        results = {}
+        try:
+            async with Connection(self.config) as connection:
+                for mail in mails:
+                    try:
+                        message = await self.prepare(mail)
+                        if not self.config.SUPPRESS_SEND:
+                            await connection.session.send_message(message)
+                        email_dispatched.send(message)
+                        results[mail.id] = None
+                    except Exception as e:
+                        results[mail.id] = str(e)
+        except Exception as e:
+            # соединение не установилось или оборвалось
+            for mail in mails:
+                results.setdefault(mail.id, str(e))
+        return results
+
+
+class MailWorker:
+    '''Фоновая отправка писем из таблицы outgoing_mails.
+
+    Письма забираются пачками: короткая транзакция сдвигает их
+    next_attempt_at на время аренды (lease), после чего пачка отправляется
+    через одно SMTP-соединение без открытой транзакции. Если воркер упал
+    во время отправки, письма снова станут доступны по истечении аренды.
+    Неудачные письма повторяются с экспоненциальной задержкой, пока не
+    закончатся попытки.
+    '''
+
+    def __init__(self, batch_size: int, poll_interval: float, max_attempts: int, backoff: float, lease: float):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.sender = MailSender(conf)
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.task = None
+
+    def notify(self):
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                count = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+                count = 0
+            if count < self.batch_size:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+
+    async def process_batch(self) -> int:
+        async with async_session_maker() as session:
+            mails = await MailCrud(use_primary(session)).claim_pending_mails(
+                self.batch_size, self.max_attempts, self.lease)
+        if not mails:
+            return 0
+        results = await self.sender.send(mails)
+        async with async_session_maker() as session:
+            await MailCrud(use_primary(session)).save_results(mails, results, self.backoff)
+        return len(mails)
+
+
+mail_worker = MailWorker(
+    batch_size=int(getenv('MAIL_BATCH_SIZE', 50)),
+    poll_interval=float(getenv('MAIL_POLL_INTERVAL', 5)),
+    max_attempts=int(getenv('MAIL_MAX_ATTEMPTS', 8)),
+    backoff=float(getenv('MAIL_RETRY_BACKOFF', 30)),
+    lease=float(getenv('MAIL_LEASE', 300))
+)
+
+
+async def send_mail(db: AsyncSession, recipients: List[str], subject: str, template_body: dict, template_name: str = 'default.html') -> OutgoingMail:
+    '''Ставит письмо в очередь, ответ на запрос не ждёт SMTP'''
+    mail = await MailCrud(db).create_mail(
+        recipients=recipients,
+        subject=subject,
+        template_body=template_body,
+        template_name=template_name
+    )
+    mail_worker.notify()
+    return mail
@@ -1,8 +1,8 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from utilities.files import init_folders
+from utilities.files import image_files_collector, image_files_deleter, init_folders
+from utilities.images import shutdown_image_executor
 from db.init import init_superuser
-from db.db import create_db_and_tables
 
 from endpoints.auth import api_router as auth_router
 from endpoints.users import api_router as users_router
@@ -14,20 +14,26 @@ from endpoints.likes import api_router as likes_router
 from endpoints.chats import api_router as chats_router
 from endpoints.messages import api_router as messages_router
 from endpoints.notifications import api_router as notifications_router
+from endpoints.ws import api_router as ws_router
+from endpoints.metrics import api_router as metrics_router
 from fastapi.middleware.cors import CORSMiddleware
 import models_events
+from notifier import notifier
+from mail.outbox import mail_worker
 app = FastAPI()
 
 app.include_router(auth_router)
 app.include_router(users_router)
 app.include_router(chats_router)
 app.include_router(notifications_router)
+app.include_router(ws_router)
 app.include_router(messages_router)
 app.include_router(likes_router)
 app.include_router(files_router)
 app.include_router(locations_router)
 app.include_router(verification_router)
 app.include_router(hobbies_router)
+app.include_router(metrics_router)
 app.mount(
     "/",
     StaticFiles(
@@ -39,9 +45,20 @@ app.mount(
 
 @app.on_event("startup")
 async def on_startup():
-    await create_db_and_tables()
     await init_superuser()
     init_folders()
+    await notifier.setup()
+    mail_worker.start()
+    image_files_collector.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await notifier.close()
+    await mail_worker.stop()
+    await image_files_collector.stop()
+    await image_files_deleter.stop()
+    shutdown_image_executor()
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
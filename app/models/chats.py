@@ -1,7 +1,7 @@
 
 from db.db import Base
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Boolean, Column, ForeignKey, DateTime, String, func, select
+from sqlalchemy import Boolean, Column, ForeignKey, DateTime, Index, Integer, String, func
 from sqlalchemy.orm import relationship, column_property, object_session
 from uuid import uuid4
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -23,6 +23,14 @@ class Message(Base):
     chat = relationship("Chat", foreign_keys=[chat_id])
     from_user = relationship("User", foreign_keys=[from_user_id])
 
+    __table_args__ = (
+        Index('ix_messages_chat_id_creation_date_id',
+              chat_id, creation_date.desc(), id.desc()),
+        Index('ix_messages_chat_id_unread', chat_id,
+              from_user_id, postgresql_where=(read == False)),
+        Index('ix_messages_from_user_id', from_user_id),
+    )
+
     def can_read(self, user_id: UUID):
         return user_id == self.chat.user_id_1 or user_id == self.chat.user_id_2
 
@@ -41,12 +49,27 @@ class Chat(Base):
         'users.id', ondelete="CASCADE"), nullable=False)
     user_2 = relationship("User", foreign_keys=[user_id_2])
     creation_date = Column(DateTime(timezone=True), server_default=func.now())
+    last_message_id = Column(UUID(as_uuid=True), ForeignKey(
+        'messages.id', ondelete="SET NULL", use_alter=True, name='fk_chats_last_message_id'), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    unread_count_1 = Column(Integer, nullable=False,
+                            default=0, server_default='0')
+    unread_count_2 = Column(Integer, nullable=False,
+                            default=0, server_default='0')
     last_message = relationship(
         Message,
-        primaryjoin="and_(Message.chat_id == Chat.id, Message.creation_date == select(func.max(Message.creation_date)).where(Message.chat_id == Chat.id).correlate(Chat).scalar_subquery())",
-        uselist=False,
+        foreign_keys=[last_message_id],
         viewonly=True
     )
 
+    __table_args__ = (
+        Index('ix_chats_user_id_1_last_message_at',
+              user_id_1, last_message_at.desc()),
+        Index('ix_chats_user_id_2_last_message_at',
+              user_id_2, last_message_at.desc()),
+        Index('uq_chats_user_pair', func.least(user_id_1, user_id_2),
+              func.greatest(user_id_1, user_id_2), unique=True),
+    )
+
     def can_read(self, user_id: UUID):
         return user_id == self.user_id_1 or user_id == self.user_id_2
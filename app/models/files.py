@@ -1,10 +1,27 @@
 from db.db import Base
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Column
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, func
 from uuid import uuid4
 
 
+class ImageBlob(Base):
+    '''Файл изображения, адресуемый по sha256 содержимого.
+
+    Одинаковые изображения хранятся один раз, ref_count - число строк
+    images, которые на него ссылаются.
+    '''
+    __tablename__ = 'image_blobs'
+
+    hash = Column(String(64), primary_key=True)
+    ref_count = Column(Integer, nullable=False, server_default='0')
+    creation_date = Column(DateTime(timezone=True), server_default=func.now())
+    released_date = Column(DateTime(timezone=True), nullable=True)
+
+
 class Image(Base):
     __tablename__ = 'images'
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    # пусто у изображений, загруженных до появления хранилища blobs
+    blob_hash = Column(String(64), ForeignKey(
+        'image_blobs.hash'), nullable=True, index=True)
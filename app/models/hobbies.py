@@ -1,6 +1,6 @@
 from db.db import Base
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Boolean, Column, ForeignKey, DateTime, func, String
+from sqlalchemy import Boolean, Column, ForeignKey, DateTime, Index, Integer, func, String
 from uuid import uuid4
 
 
@@ -12,8 +12,21 @@ class UserHobby(Base):
         'hobbies.id'), primary_key=True)
     creation_date = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index('ix_user_hobbies_hobby_id', hobby_id),
+    )
+
 
 class Hobby(Base):
     __tablename__ = 'hobbies'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name = Column(String, nullable=False)
+    # число пользователей с этим хобби, обновляется в HobbiesCrud
+    user_count = Column(Integer, nullable=False,
+                        default=0, server_default='0')
+
+    __table_args__ = (
+        Index('ix_hobbies_user_count', user_count.desc(), id),
+        Index('ix_hobbies_name_trgm', func.lower(name).label('name_lower'),
+              postgresql_using='gin', postgresql_ops={'name_lower': 'gin_trgm_ops'}),
+    )
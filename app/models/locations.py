@@ -1,6 +1,6 @@
 from db.db import Base
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Column, ForeignKey, String
+from sqlalchemy import Column, ForeignKey, Index, String, func
 from sqlalchemy.orm import relationship
 from uuid import uuid4
 
@@ -10,10 +10,21 @@ class City(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name = Column(String, nullable=False)
 
+    __table_args__ = (
+        Index('ix_cities_name_trgm', func.lower(name).label('name_lower'),
+              postgresql_using='gin', postgresql_ops={'name_lower': 'gin_trgm_ops'}),
+    )
+
 
 class Institution(Base):
     __tablename__ = 'institutions'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name = Column(String, nullable=False)
-    city_id = Column(UUID(as_uuid=True), ForeignKey(City.id), nullable=False)
+    city_id = Column(UUID(as_uuid=True), ForeignKey(
+        City.id), nullable=False, index=True)
     city = relationship(City, foreign_keys=[city_id])
+
+    __table_args__ = (
+        Index('ix_institutions_name_trgm', func.lower(name).label('name_lower'),
+              postgresql_using='gin', postgresql_ops={'name_lower': 'gin_trgm_ops'}),
+    )
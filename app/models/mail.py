@@ -0,0 +1,25 @@
+from db.db import Base
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
+from sqlalchemy import Column, DateTime, Index, Integer, String, func, text
+from uuid import uuid4
+
+
+class OutgoingMail(Base):
+    '''Письмо в очереди на отправку (outbox)'''
+    __tablename__ = 'outgoing_mails'
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    creation_date = Column(DateTime(timezone=True), server_default=func.now())
+    recipients = Column(ARRAY(String), nullable=False)
+    subject = Column(String, nullable=False)
+    template_body = Column(JSONB, nullable=False)
+    template_name = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    next_attempt_at = Column(DateTime(timezone=True),
+                             nullable=False, server_default=func.now())
+    sent_date = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index('ix_outgoing_mails_pending', next_attempt_at,
+              postgresql_where=text('sent_date IS NULL')),
+    )
@@ -1,6 +1,6 @@
 from db.db import Base
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String, func
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, String, func
 from uuid import uuid4
 
 
@@ -13,3 +13,8 @@ class Notification(Base):
     header = Column(String, nullable=False)
     read = Column(Boolean, nullable=False, default=False)
     creation_date = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_notifications_user_id_read_creation_date',
+              user_id, read, creation_date.desc()),
+    )
@@ -3,7 +3,7 @@ import uuid
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID
 from db.db import Base
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import Boolean, Column, ForeignKey, String, DateTime, func
+from sqlalchemy import Boolean, Column, ForeignKey, Index, String, DateTime, func
 from sqlalchemy.orm import relationship
 from models.locations import Institution
 
@@ -34,6 +34,13 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
         return age
 
 
+# email объявлен в SQLAlchemyBaseUserTableUUID, поэтому индексы поиска задаются после класса
+Index('ix_users_name_trgm', func.lower(User.name).label('name_lower'),
+      postgresql_using='gin', postgresql_ops={'name_lower': 'gin_trgm_ops'})
+Index('ix_users_email_trgm', func.lower(User.email).label('email_lower'),
+      postgresql_using='gin', postgresql_ops={'email_lower': 'gin_trgm_ops'})
+
+
 class UserLike(Base):
     __tablename__ = "user_likes"
 
@@ -47,3 +54,9 @@ class UserLike(Base):
     like = Column(Boolean, nullable=False, default=True)
     like_date = Column(DateTime(timezone=True),
                        server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index('uq_user_likes_user_id_liked_user_id',
+              user_id, liked_user_id, unique=True),
+        Index('ix_user_likes_liked_user_id_like', liked_user_id, like),
+    )
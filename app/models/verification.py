@@ -10,7 +10,7 @@ class VerificationRequest(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     creation_date = Column(DateTime(timezone=True), server_default=func.now())
     user_id = Column(UUID(as_uuid=True), ForeignKey(
-        'users.id'), nullable=False)
+        'users.id'), nullable=False, index=True)
     user = relationship("User", foreign_keys=[user_id])
     updated_date = Column(DateTime(timezone=True),
                           onupdate=func.now())
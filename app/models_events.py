@@ -1,17 +1,30 @@
-import asyncio
-from models.files import Image
-from utilities.files import get_image_path
-from pathlib import Path
-from sqlalchemy import event
+from models.files import Image, ImageBlob
+from utilities.files import image_files_deleter
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session, object_session
 
 
-async def delete_image_file(target: Image):
-    image_path = await get_image_path(image=target)
-    path = Path(image_path)
-    if path.exists():
-        path.unlink()
+@event.listens_for(Image, "before_delete")
+def receive_before_delete(mapper, connection, target: Image):
+    if target.blob_hash is not None:
+        # сам файл blob удаляет сборщик, когда ссылок не останется
+        connection.execute(
+            update(ImageBlob)
+            .where(ImageBlob.hash == target.blob_hash)
+            .values(ref_count=ImageBlob.ref_count - 1, released_date=func.now())
+        )
+    # файл удаляется только после коммита
+    object_session(target).info.setdefault(
+        'deleted_images_ids', set()).add(target.id)
 
 
-@event.listens_for(Image, "before_delete")
-def receive_after_delete(mapper, connection, target: Image):
-    asyncio.create_task(delete_image_file(target=target))
+@event.listens_for(Session, "after_commit")
+def receive_after_commit(session: Session):
+    images_ids = session.info.pop('deleted_images_ids', None)
+    if images_ids:
+        image_files_deleter.schedule(images_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def receive_after_rollback(session: Session):
+    session.info.pop('deleted_images_ids', None)
@@ -1,59 +1,300 @@
 import asyncio
+from enum import Enum
 import json
-from typing import Dict
+from os import getenv
+from typing import Awaitable, Callable, Dict
 import uuid
+import aio_pika
 from fastapi import WebSocket
-from typing import Dict
+
+
+DeliverHandler = Callable[[str, Dict], Awaitable[None]]
+
+
+class LocalBackend:
+    '''Доставляет сообщения внутри текущего процесса (один воркер, тесты)'''
+
+    def __init__(self):
+        self.handler: DeliverHandler | None = None
+
+    async def setup(self, handler: DeliverHandler):
+        self.handler = handler
+
+    async def publish(self, key: str, data: Dict):
+        await self.handler(key, data)
+
+    async def subscribe(self, key: str):
+        pass
+
+    async def unsubscribe(self, key: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+class RabbitMQBackend:
+    '''Рассылает сообщения между воркерами через RabbitMQ.
+
+    Каждый воркер держит свою эксклюзивную очередь и привязывает её к
+    ключу маршрутизации канала, только пока у него есть сокеты этого
+    канала.
+    '''
+    exchange_name = 'notifier'
+
+    def __init__(self, url: str):
+        self.url = url
+        self.handler: DeliverHandler | None = None
+        self.connection = None
+        self.exchange = None
+        self.queue = None
+
+    async def setup(self, handler: DeliverHandler):
+        self.handler = handler
+        self.connection = await aio_pika.connect_robust(self.url)
+        channel = await self.connection.channel()
+        self.exchange = await channel.declare_exchange(
+            self.exchange_name, aio_pika.ExchangeType.DIRECT)
+        self.queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await self.queue.consume(self._on_message, no_ack=True)
+
+    async def _on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        await self.handler(message.routing_key, json.loads(message.body))
+
+    async def publish(self, key: str, data: Dict):
+        await self.exchange.publish(
+            aio_pika.Message(body=json.dumps(data).encode()),
+            routing_key=key
+        )
+
+    async def subscribe(self, key: str):
+        await self.queue.bind(self.exchange, routing_key=key)
+
+    async def unsubscribe(self, key: str):
+        await self.queue.unbind(self.exchange, routing_key=key)
+
+    async def close(self):
+        if self.connection:
+            await self.connection.close()
+
+
+def get_backend():
+    broker_url = getenv('NOTIFIER_BROKER_URL')
+    if broker_url:
+        return RabbitMQBackend(broker_url)
+    return LocalBackend()
+
+
+class OverflowPolicy(str, Enum):
+    DROP_OLDEST = 'drop_oldest'
+    COALESCE = 'coalesce'
+    DISCONNECT = 'disconnect'
+
+
+class Connection:
+    '''Сокет клиента с собственной ограниченной очередью исходящих сообщений.
+
+    Сообщения кладутся в очередь без ожидания, отправкой занимается отдельная
+    задача, поэтому медленный клиент не задерживает остальных. При
+    переполнении очереди применяется overflow_policy:
+    drop_oldest отбрасывает самое старое сообщение, coalesce заменяет
+    все ожидающие сообщения последним, disconnect закрывает сокет.
+
+    Мультиплексированный сокет может быть подписан на несколько каналов,
+    его сообщения помечаются именем канала (topic).
+    '''
+    slow_consumer_close_code = 1013
+
+    def __init__(self, websocket: WebSocket, max_size: int, overflow_policy: OverflowPolicy, multiplexed: bool = False):
+        self.websocket = websocket
+        self.overflow_policy = overflow_policy
+        self.multiplexed = multiplexed
+        self.topics: set[str] = set()
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_size)
+        self.writer: asyncio.Task | None = None
+        self.closer: asyncio.Task | None = None
+        self.closed = False
+
+    def start(self):
+        self.writer = asyncio.create_task(self._write())
+
+    def put(self, data: str):
+        if self.closed:
+            return
+        if self.queue.full():
+            if self.overflow_policy == OverflowPolicy.DISCONNECT:
+                self.close()
+                self.closer = asyncio.create_task(self.websocket.close(
+                    code=self.slow_consumer_close_code))
+                self.closer.add_done_callback(self._on_closed)
+                return
+            if self.overflow_policy == OverflowPolicy.COALESCE:
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+            else:
+                self.queue.get_nowait()
+        self.queue.put_nowait(data)
+
+    async def _write(self):
+        try:
+            while True:
+                data = await self.queue.get()
+                await self.websocket.send_text(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.closed = True
+
+    @staticmethod
+    def _on_closed(task: asyncio.Task):
+        # клиент мог уже отключиться, ошибка закрытия не важна
+        if not task.cancelled():
+            task.exception()
+
+    def close(self):
+        self.closed = True
+        if self.writer:
+            self.writer.cancel()
 
 
 class Notifier:
+    '''Реестр каналов (namespace, user_id) -> сокеты.
+
+    Пустые каналы удаляются сразу после отключения последнего сокета,
+    поэтому память зависит только от числа открытых соединений.
+    '''
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance.connections = {}
+            cls._instance.namespace_counts = {}
             cls._instance.is_ready = False
-            cls._instance.prefix = ""
-            cls._instance.message_queue = []
+            cls._instance.backend = get_backend()
+            cls._instance.queue_size = int(getenv('NOTIFIER_QUEUE_SIZE', 100))
+            cls._instance.overflow_policy = OverflowPolicy(
+                getenv('NOTIFIER_OVERFLOW_POLICY', OverflowPolicy.DROP_OLDEST.value))
         return cls._instance
 
+    @staticmethod
+    def channel_key(namespace: str, user_id: str) -> str:
+        return f'{namespace}:{user_id}'
+
     async def setup(self):
         if self.is_ready:
             return
+        await self.backend.setup(self._deliver)
         self.is_ready = True
 
-    async def push(self, user_id: uuid.UUID, data: Dict):
-        user_id_str = str(user_id)
-        if user_id_str not in self.connections:
-            await self.create_channel(user_id_str)
-        self.message_queue.append((user_id_str, data))
-        await self._notify(user_id_str)
+    async def close(self):
+        for connections in self.connections.values():
+            for connection in connections.values():
+                connection.close()
+        self.connections = {}
+        self.namespace_counts = {}
+        await self.backend.close()
+        self.is_ready = False
 
-    async def connect(self, user_id: uuid.UUID, websocket: WebSocket):
-        user_id_str = str(user_id)
-        if user_id_str not in self.connections:
-            await self.create_channel(user_id_str)
+    def connection_counts(self) -> Dict[str, int]:
+        return dict(self.namespace_counts)
+
+    async def push(self, namespace: str, user_id: uuid.UUID, data: Dict):
+        await self.setup()
+        await self.backend.publish(self.channel_key(namespace, str(user_id)), data)
+
+    async def _deliver(self, key: str, data: Dict):
+        namespace, user_id = key.rsplit(':', 1)
+        connections = self.connections.get((namespace, user_id))
+        if not connections:
+            return
+        message = tagged_message = None
+        for connection in connections.values():
+            if connection.multiplexed:
+                if tagged_message is None:
+                    tagged_message = json.dumps({
+                        'topic': namespace,
+                        'data': json.loads(data) if isinstance(data, str) else data
+                    })
+                connection.put(tagged_message)
+            else:
+                if message is None:
+                    message = json.dumps((user_id, data))
+                connection.put(message)
+
+    async def accept(self, websocket: WebSocket, multiplexed: bool = False) -> Connection:
+        await self.setup()
         await websocket.accept()
-        self.connections[user_id_str].append(websocket)
+        connection = Connection(
+            websocket=websocket,
+            max_size=self.queue_size,
+            overflow_policy=self.overflow_policy,
+            multiplexed=multiplexed
+        )
+        connection.start()
+        return connection
+
+    async def subscribe(self, namespace: str, user_id: uuid.UUID, connection: Connection):
+        channel = (namespace, str(user_id))
+        if channel not in self.connections:
+            await self.create_channel(*channel)
+        if connection.websocket in self.connections[channel]:
+            return
+        self.connections[channel][connection.websocket] = connection
+        connection.topics.add(namespace)
+        self.namespace_counts[namespace] = self.namespace_counts.get(
+            namespace, 0) + 1
+
+    async def unsubscribe(self, namespace: str, user_id: uuid.UUID, websocket: WebSocket) -> Connection | None:
+        channel = (namespace, str(user_id))
+        connections = self.connections.get(channel)
+        if connections is None:
+            return None
+        connection = connections.pop(websocket, None)
+        if connection:
+            connection.topics.discard(namespace)
+            self.namespace_counts[namespace] -= 1
+            if not self.namespace_counts[namespace]:
+                del self.namespace_counts[namespace]
+        if not connections:
+            del self.connections[channel]
+            await self.backend.unsubscribe(self.channel_key(*channel))
+        return connection
+
+    async def connect(self, namespace: str, user_id: uuid.UUID, websocket: WebSocket):
+        connection = await self.accept(websocket)
+        await self.subscribe(namespace, user_id, connection)
+
+    async def create_channel(self, namespace: str, user_id: str):
+        self.connections[(namespace, user_id)] = {}
+        await self.backend.subscribe(self.channel_key(namespace, user_id))
+
+    async def remove(self, namespace: str, user_id: uuid.UUID, websocket: WebSocket):
+        connection = await self.unsubscribe(namespace, user_id, websocket)
+        if connection:
+            connection.close()
 
-    async def create_channel(self, user_id: str):
-        self.connections[user_id] = []
+    async def disconnect(self, user_id: uuid.UUID, connection: Connection):
+        for namespace in list(connection.topics):
+            await self.unsubscribe(namespace, user_id, connection.websocket)
+        connection.close()
 
-    def remove(self, user_id: uuid.UUID, websocket: WebSocket):
-        user_id_str = str(user_id)
-        self.connections[user_id_str].remove(websocket)
 
-    async def _notify(self, user_id: str):
-        if user_id in self.connections:
-            living_connections = []
-            while len(self.connections[user_id]) > 0:
-                websocket = self.connections[user_id].pop()
-                if self.message_queue:
-                    data = json.dumps(self.message_queue.pop(0))
-                    await websocket.send_text(data)
-                    living_connections.append(websocket)
-            self.connections[user_id] = living_connections
+class NotifierNamespace:
+    '''Представление Notifier, привязанное к одному пространству имён'''
+
+    def __init__(self, notifier: Notifier, namespace: str):
+        self.notifier = notifier
+        self.namespace = namespace
+
+    async def push(self, user_id: uuid.UUID, data: Dict):
+        await self.notifier.push(self.namespace, user_id, data)
+
+    async def connect(self, user_id: uuid.UUID, websocket: WebSocket):
+        await self.notifier.connect(self.namespace, user_id, websocket)
+
+    async def remove(self, user_id: uuid.UUID, websocket: WebSocket):
+        await self.notifier.remove(self.namespace, user_id, websocket)
 
 
 notifier = Notifier()
@@ -61,7 +302,6 @@ notifier = Notifier()
 
 def get_notifier(prefix):
 
-    def get_with_prefix() -> Notifier:
-        notifier.prefix = prefix
-        return notifier
+    def get_with_prefix() -> NotifierNamespace:
+        return NotifierNamespace(notifier, prefix)
     return get_with_prefix
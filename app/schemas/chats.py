@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import List
 from uuid import UUID
 from pydantic import BaseModel
 from schemas.users import UserReadShort
@@ -17,6 +18,12 @@ class Message(BaseModel):
         from_attributes = True
 
 
+class MessagesPage(BaseModel):
+    items: List[Message]
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+
 class Chat(BaseModel):
     id: UUID
     user_id_1: UUID
@@ -79,6 +79,12 @@ class UserLike(BaseModel):
     is_match: bool = False
 
 
+class Swipe(BaseModel):
+    user_id: uuid.UUID
+    like: bool
+    timestamp: datetime
+
+
 class UserLikeFull(BaseModel):
     is_match: bool = False
     liked_user: UserReadShort
@@ -0,0 +1,19 @@
+import os
+import sys
+
+# модули приложения читают настройки при импорте
+for name, value in {
+    'SECRET': 'test',
+    'EMAIL_USERNAME': 'test',
+    'EMAIL_PASSWORD': 'test',
+    'EMAIL_FROM': 'noreply@example.com',
+    'EMAIL_SERVER': 'localhost',
+    'EMAIL_PORT': '465',
+    'POSTGRES_USER': 'test',
+    'POSTGRES_PASSWORD': 'test',
+    'POSTGRES_HOST': 'localhost',
+    'POSTGRES_DB': 'test',
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
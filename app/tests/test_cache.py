@@ -0,0 +1,32 @@
+import time
+from utilities.cache import TTLCache
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+
+
+def test_expired_items_are_dropped(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    cache = TTLCache(max_size=10, ttl=5)
+    cache.set('a', 1)
+    cache.replace('a', 2)
+    assert cache.get('a') == 2
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 5)
+    # replace не продлевает запись
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_replace_and_pop_skip_missing_keys():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.replace('a', 1)
+    assert cache.pop('a') is None
+    assert cache.get('a') is None
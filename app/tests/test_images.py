@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import BrokenExecutor
+import os
+import time
+import pytest
+from PIL import Image as pillow
+from utilities import images
+from utilities.images import ImageDecodeError, process_image, run_in_image_executor
+
+
+def exit_worker():
+    os._exit(1)
+
+
+@pytest.fixture(autouse=True)
+def image_executor():
+    yield
+    images.shutdown_image_executor()
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    pillow.effect_noise((2000, 2000), 64).convert('RGB').save(path, 'JPEG')
+    return str(path)
+
+
+def test_corrupted_upload_is_a_decode_error(tmp_path):
+    path = tmp_path / 'broken.png'
+    path.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\x00' * 64)
+
+    with pytest.raises(ImageDecodeError):
+        asyncio.run(run_in_image_executor(
+            process_image, str(path), str(tmp_path / 'out.png'), (100, 100)))
+    assert not (tmp_path / 'out.png').exists()
+
+
+def test_broken_pool_is_recreated(photo, tmp_path):
+    async def run():
+        with pytest.raises(BrokenExecutor):
+            await run_in_image_executor(exit_worker)
+        return await run_in_image_executor(
+            process_image, photo, str(tmp_path / 'out.png'), (100, 100))
+
+    assert len(asyncio.run(run())) == 64
+
+
+def test_concurrent_uploads_do_not_stall_event_loop(photo, tmp_path):
+    '''Максимальная задержка цикла событий, пока обрабатываются 8 загрузок'''
+    async def run():
+        # прогрев: запуск процессов пула не относится к обработке
+        await run_in_image_executor(
+            process_image, photo, str(tmp_path / 'warmup.png'), (100, 100))
+        stalls = []
+        done = asyncio.Event()
+
+        async def ticker():
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                stalls.append(time.perf_counter() - started - 0.005)
+        ticker_task = asyncio.create_task(ticker())
+        await asyncio.gather(*[
+            run_in_image_executor(process_image, photo, str(tmp_path / f'{i}.png'), (1000, 1000))
+            for i in range(8)
+        ])
+        done.set()
+        await ticker_task
+        return max(stalls)
+
+    assert asyncio.run(run()) < 0.1
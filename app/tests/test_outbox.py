@@ -0,0 +1,106 @@
+import asyncio
+import email
+from email.header import decode_header, make_header
+import socket
+import uuid
+from aiosmtpd.controller import Controller
+from fastapi_mail import ConnectionConfig
+import pytest
+from mail.conf import conf
+from mail.outbox import MailSender
+from models.mail import OutgoingMail
+
+
+class Recorder:
+    def __init__(self):
+        self.envelopes = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        return '250 OK'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_config(port: int) -> ConnectionConfig:
+    return ConnectionConfig(
+        MAIL_USERNAME='',
+        MAIL_PASSWORD='',
+        MAIL_FROM='noreply@example.com',
+        MAIL_FROM_NAME='Тест',
+        MAIL_PORT=port,
+        MAIL_SERVER='127.0.0.1',
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=False,
+        TIMEOUT=5,
+        TEMPLATE_FOLDER=conf.TEMPLATE_FOLDER,
+    )
+
+
+def make_mail(recipient: str, **kwargs) -> OutgoingMail:
+    return OutgoingMail(
+        id=uuid.uuid4(),
+        recipients=[recipient],
+        subject='Подтверждение почты',
+        template_body={'title': 'Подтверждение почты', 'text': '<p>Здравствуйте</p>'},
+        template_name='default.html',
+        attempts=0,
+        **kwargs
+    )
+
+
+@pytest.fixture
+def smtp_server():
+    recorder = Recorder()
+    controller = Controller(recorder, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield controller, recorder
+    controller.stop()
+
+
+def test_batch_is_sent_through_one_connection(smtp_server):
+    controller, recorder = smtp_server
+    sessions = []
+    original = controller.factory
+
+    def factory():
+        server = original()
+        sessions.append(server)
+        return server
+    controller.factory = factory
+
+    mails = [make_mail('first@example.com'), make_mail('second@example.com')]
+    results = asyncio.run(MailSender(make_config(controller.port)).send(mails))
+
+    assert results == {mail.id: None for mail in mails}
+    assert [envelope.rcpt_tos for envelope in recorder.envelopes] == [
+        ['first@example.com'], ['second@example.com']]
+    assert len(sessions) == 1
+    message = email.message_from_bytes(recorder.envelopes[0].content)
+    assert str(make_header(decode_header(message['Subject']))) == 'Подтверждение почты'
+    assert str(make_header(decode_header(message['From']))) == 'Тест <noreply@example.com>'
+    html = message.get_payload()[0].get_payload(decode=True).decode()
+    assert '<p>Здравствуйте</p>' in html
+
+
+def test_connection_error_fails_every_mail():
+    mails = [make_mail('first@example.com'), make_mail('second@example.com')]
+    results = asyncio.run(MailSender(make_config(free_port())).send(mails))
+
+    assert set(results) == {mail.id for mail in mails}
+    assert all(results.values())
+
+
+def test_rejected_recipient_does_not_stop_batch(smtp_server):
+    controller, recorder = smtp_server
+    mails = [make_mail('not an address'), make_mail('second@example.com')]
+    results = asyncio.run(MailSender(make_config(controller.port)).send(mails))
+
+    assert results[mails[0].id]
+    assert results[mails[1].id] is None
+    assert [envelope.rcpt_tos for envelope in recorder.envelopes] == [['second@example.com']]
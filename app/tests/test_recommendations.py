@@ -0,0 +1,91 @@
+import asyncio
+import random
+import uuid
+from utilities.recommendations import ScoringProfiles
+
+
+def make_profiles() -> ScoringProfiles:
+    return ScoringProfiles(max_size=1000, ttl=60, institution_weight=0.5, city_weight=0.25)
+
+
+def make_loader(rows, calls=None):
+    rows = {row[0]: row for row in rows}
+
+    async def loader(users_ids):
+        if calls is not None:
+            calls.append(list(users_ids))
+        return [rows[user_id] for user_id in users_ids if user_id in rows]
+    return loader
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def test_score_matches_set_jaccard():
+    rng = random.Random(13)
+    hobbies = [uuid.uuid4() for _ in range(200)]
+    users = {uuid.uuid4(): set(rng.sample(hobbies, rng.randint(0, 20))) for _ in range(300)}
+    profiles = make_profiles()
+    loaded = asyncio.run(profiles.get_many(
+        list(users), make_loader([(user_id, None, None, list(h)) for user_id, h in users.items()])))
+    ids = list(users)
+    for user_id, candidate_id in zip(ids, reversed(ids)):
+        expected = jaccard(users[user_id], users[candidate_id])
+        assert abs(profiles.score(loaded[user_id], loaded[candidate_id]) - expected) < 1e-9
+
+
+def test_rank_adds_institution_and_city_weights():
+    hobby, other = uuid.uuid4(), uuid.uuid4()
+    institution, city = uuid.uuid4(), uuid.uuid4()
+    user, same_hobby, same_institution, same_city, stranger = (uuid.uuid4() for _ in range(5))
+    loader = make_loader([
+        (user, institution, city, [hobby]),
+        (same_hobby, None, None, [hobby, other]),
+        (same_institution, institution, city, []),
+        (same_city, None, city, []),
+        (stranger, None, None, [other]),
+    ])
+    ranked = asyncio.run(make_profiles().rank(
+        user, [stranger, same_city, same_hobby, same_institution], loader))
+    # 0.5 + 0.25 > 0.5 (1 общее хобби из 2) > 0.25 > 0
+    assert ranked == [same_institution, same_hobby, same_city, stranger]
+
+
+def test_cached_profiles_are_not_reloaded():
+    user, candidate = uuid.uuid4(), uuid.uuid4()
+    calls = []
+    loader = make_loader([(user, None, None, []), (candidate, None, None, [])], calls)
+    profiles = make_profiles()
+    asyncio.run(profiles.rank(user, [candidate], loader))
+    asyncio.run(profiles.rank(user, [candidate], loader))
+    assert calls == [[user, candidate]]
+
+
+def test_toggle_hobby_updates_cached_mask():
+    hobby = uuid.uuid4()
+    user, candidate = uuid.uuid4(), uuid.uuid4()
+    profiles = make_profiles()
+    loaded = asyncio.run(profiles.get_many(
+        [user, candidate], make_loader([(user, None, None, []), (candidate, None, None, [hobby])])))
+    assert profiles.score(loaded[user], loaded[candidate]) == 0
+
+    profiles.toggle_hobby(user, hobby, added=True)
+    loaded = asyncio.run(profiles.get_many([user, candidate], make_loader([])))
+    assert profiles.score(loaded[user], loaded[candidate]) == 1
+
+    profiles.toggle_hobby(user, hobby, added=False)
+    loaded = asyncio.run(profiles.get_many([user, candidate], make_loader([])))
+    assert profiles.score(loaded[user], loaded[candidate]) == 0
+
+
+def test_recently_used_profiles_survive_eviction():
+    first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    calls = []
+    loader = make_loader([(user_id, None, None, []) for user_id in (first, second, third)], calls)
+    profiles = ScoringProfiles(max_size=2, ttl=60, institution_weight=0.5, city_weight=0.25)
+    asyncio.run(profiles.get_many([first, second], loader))
+    asyncio.run(profiles.get_many([first], loader))
+    asyncio.run(profiles.get_many([third], loader))
+    asyncio.run(profiles.get_many([first], loader))
+    assert calls == [[first, second], [third]]
@@ -0,0 +1,30 @@
+import importlib
+import inspect
+import pkgutil
+from fastapi.routing import APIWebSocketRoute
+import endpoints
+
+
+def websocket_routes():
+    for module_info in pkgutil.iter_modules(endpoints.__path__):
+        module = importlib.import_module(f'endpoints.{module_info.name}')
+        router = getattr(module, 'api_router', None)
+        for route in getattr(router, 'routes', []):
+            if isinstance(route, APIWebSocketRoute):
+                yield route
+
+
+def yield_dependencies(dependant):
+    for dependency in dependant.dependencies:
+        if inspect.isasyncgenfunction(dependency.call) or inspect.isgeneratorfunction(dependency.call):
+            yield dependency.call
+        yield from yield_dependencies(dependency)
+
+
+def test_websockets_do_not_hold_db_sessions():
+    '''Зависимости с yield живут до закрытия сокета, поэтому сессия БД из них
+    держала бы соединение пула все время, пока сокет открыт'''
+    routes = list(websocket_routes())
+    assert routes
+    for route in routes:
+        assert list(yield_dependencies(route.dependant)) == [], route.path
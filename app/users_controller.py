@@ -1,6 +1,6 @@
 from datetime import datetime
 import uuid
-from typing import Optional
+from typing import Any, Dict, Optional
 import contextlib
 from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
@@ -12,12 +12,15 @@ from fastapi_users.authentication import (
 from fastapi_users.db import SQLAlchemyUserDatabase
 from models.user import User
 from os import getenv
-from db.db import get_async_session, AsyncSession, get_async_session_context
+from db.db import get_async_session, AsyncSession, get_async_session_context, use_primary
 from schemas.users import UserCreate
-from fastapi_users.exceptions import UserAlreadyExists
+from fastapi_users.exceptions import InvalidID, UserAlreadyExists, UserNotExists
+from fastapi_users.jwt import decode_jwt
+import jwt
 from fastapi_users.authentication import CookieTransport
-from mail.conf import conf
-from fastapi_mail import FastMail, MessageSchema, MessageType
+from mail.outbox import send_mail
+from utilities.auth import user_cache
+from utilities.profiles import profile_cache
 
 SECRET = getenv("SECRET")
 
@@ -36,6 +39,22 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
             await self.request_verify(user=user, request=request)
 
 
+    async def on_after_update(self, user: User, update_dict: Dict[str, Any], request: Optional[Request] = None):
+        user_cache.invalidate(user.id)
+        profile_cache.invalidate(user.id)
+
+    async def on_after_verify(self, user: User, request: Optional[Request] = None):
+        user_cache.invalidate(user.id)
+        profile_cache.invalidate(user.id)
+
+    async def on_after_reset_password(self, user: User, request: Optional[Request] = None):
+        user_cache.invalidate(user.id)
+        profile_cache.invalidate(user.id)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        user_cache.invalidate(user.id)
+        profile_cache.invalidate(user.id)
+
     async def on_after_forgot_password(
         self, user: User, token: str, request: Optional[Request] = None
     ):
@@ -43,9 +62,9 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
             f'Пользователь {user.id} запросил сброс пароля, верефицирован ли он: {user.is_verified}')
         if not user.is_verified:
             return
-        message = MessageSchema(
+        await send_mail(
+            self.user_db.session,
             subject='Сброс пароля',
-            # List of recipients, as many as you can pass
             recipients=[user.email],
             template_body={
                 'title': 'Сброс пароля',
@@ -72,20 +91,15 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
                             >
                                 Сбросить пароль
                             </a>'''
-            },
-            subtype=MessageType.html
+            }
         )
-        try:
-            fm = FastMail(conf)
-            await fm.send_message(message, template_name='default.html')
-        except Exception as e:
-            print(e)
 
     async def on_after_request_verify(
         self, user: User, token: str, request: Optional[Request] = None
     ):
         print(f'Пользователь {user.id} запросил верификацию')
-        message = MessageSchema(
+        await send_mail(
+            self.user_db.session,
             subject='Подтверждение почты',
             recipients=[user.email],
             template_body={
@@ -101,14 +115,8 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
                             >
                                 Подтвердить почту
                             </a>'''
-            },
-            subtype=MessageType.html
+            }
         )
-        try:
-            fm = FastMail(conf)
-            await fm.send_message(message, template_name='default.html')
-        except Exception as e:
-            print(e)
 
 
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
@@ -118,8 +126,33 @@ async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db
 cookie_transport = CookieTransport(cookie_max_age=3600, cookie_samesite="none")
 
 
+class CachedJWTStrategy(JWTStrategy):
+    '''JWTStrategy, которая берет пользователя из user_cache вместо SELECT'''
+
+    async def read_token(self, token: Optional[str], user_manager: BaseUserManager[User, uuid.UUID]) -> Optional[User]:
+        if token is None:
+            return None
+        try:
+            data = decode_jwt(token, self.decode_key,
+                              self.token_audience, algorithms=[self.algorithm])
+            user_id = user_manager.parse_id(data.get("sub"))
+        except (jwt.PyJWTError, InvalidID):
+            return None
+        user = await user_cache.get(user_id, user_manager.user_db.session)
+        if user is not None:
+            return user
+        # в кэш попадает только строка с основной БД, не с отставшей реплики
+        use_primary(user_manager.user_db.session)
+        try:
+            user = await user_manager.get(user_id)
+        except UserNotExists:
+            return None
+        user_cache.set(user)
+        return user
+
+
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return CachedJWTStrategy(secret=SECRET, lifetime_seconds=3600)
 
 
 auth_backend = AuthenticationBackend(
@@ -0,0 +1,46 @@
+from os import getenv
+import uuid
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from models.user import User
+from utilities.cache import TTLCache
+
+
+class UserCache:
+    '''LRU-кэш пользователей для авторизации по JWT.
+
+    Хранятся отсоединенные копии со значениями колонок. В сессию запроса
+    копия добавляется через merge(load=False), без SELECT, а изменения
+    в запросе не затрагивают саму копию.
+    '''
+
+    def __init__(self, max_size: int, ttl: float):
+        self.users: TTLCache[uuid.UUID, User] = TTLCache(max_size, ttl)
+
+    @staticmethod
+    def snapshot(user: User) -> User:
+        copy = User(**{
+            attribute.key: getattr(user, attribute.key)
+            for attribute in inspect(User).column_attrs
+        })
+        make_transient_to_detached(copy)
+        return copy
+
+    async def get(self, user_id: uuid.UUID, session: AsyncSession) -> User | None:
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        return await session.merge(user, load=False)
+
+    def set(self, user: User):
+        self.users.set(user.id, self.snapshot(user))
+
+    def invalidate(self, user_id: uuid.UUID):
+        self.users.pop(user_id)
+
+
+user_cache = UserCache(
+    max_size=int(getenv('AUTH_CACHE_SIZE', 10000)),
+    ttl=float(getenv('AUTH_CACHE_TTL', 30))
+)
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+import time
+from typing import Dict, Generic, Hashable, Iterable, Tuple, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class TTLCache(Generic[K, V]):
+    '''LRU-кэш в памяти воркера с ограничением числа записей и времени жизни.
+
+    Записи сбрасываются явно через pop при изменении данных. Другие воркеры
+    об этом не узнают, поэтому ttl задаёт, сколько они могут отдавать
+    устаревшее значение.
+    '''
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.items: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, key: K) -> V | None:
+        item = self.items.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self.items[key]
+            return None
+        self.items.move_to_end(key)
+        return item[1]
+
+    def get_many(self, keys: Iterable[K]) -> Dict[K, V]:
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set(self, key: K, value: V) -> V:
+        self.items[key] = (time.monotonic() + self.ttl, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+        return value
+
+    def replace(self, key: K, value: V):
+        '''Меняет значение, не продлевая ttl; отсутствующий ключ пропускается'''
+        item = self.items.get(key)
+        if item is not None:
+            self.items[key] = (item[0], value)
+
+    def pop(self, key: K) -> V | None:
+        item = self.items.pop(key, None)
+        return item[1] if item else None
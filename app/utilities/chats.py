@@ -1,8 +1,102 @@
-
+from os import getenv
+import uuid
+from typing import List, Tuple
+from db.db import get_async_session_context, use_primary
+from cruds.chats_crud import ChatsCrud
+from cruds.users_cruds import UsersCrud
+from models.chats import Chat
 from schemas.chats import ChatWithUsers
+from utilities.cache import TTLCache
 
 
 def set_chat_info(chat, unread_count) -> ChatWithUsers:
     chat_obj = ChatWithUsers.model_validate(chat, from_attributes=True)
     chat_obj.unreaded = unread_count
     return chat_obj
+
+
+async def get_chats_info(db, chats: List[Tuple[Chat, int]]) -> List[ChatWithUsers]:
+    '''Собирает ChatWithUsers из чатов, загруженных с load_users=False.
+
+    Участники и авторы последних сообщений берутся из кэша профилей,
+    недостающие загружаются одним запросом. Чаты, для которых профиль так
+    и не нашелся (например, реплика отстает), загружаются целиком из
+    основной БД.
+    '''
+    users_ids = set()
+    for chat, _ in chats:
+        users_ids.update((chat.user_id_1, chat.user_id_2, chat.last_message.from_user_id))
+    profiles = {profile['id']: profile for profile in await UsersCrud(db).get_user_profiles(list(users_ids))}
+    incomplete_ids = {
+        chat.id for chat, _ in chats
+        if not {chat.user_id_1, chat.user_id_2, chat.last_message.from_user_id} <= profiles.keys()
+    }
+    loaded_chats = {}
+    if incomplete_ids:
+        loaded_chats = {chat.id: chat for chat in await ChatsCrud(use_primary(db)).get_chats(list(incomplete_ids))}
+    chats_info = []
+    for chat, unread_count in chats:
+        if chat.id in loaded_chats:
+            chats_info.append(set_chat_info(chat=loaded_chats[chat.id], unread_count=unread_count))
+            continue
+        if chat.id in incomplete_ids:
+            # чата уже нет в основной БД: он удален после выборки страницы
+            continue
+        message = chat.last_message
+        chats_info.append(ChatWithUsers(
+            id=chat.id,
+            user_id_1=chat.user_id_1,
+            user_id_2=chat.user_id_2,
+            creation_date=chat.creation_date,
+            last_message={
+                'id': message.id,
+                'chat_id': message.chat_id,
+                'from_user': profiles[message.from_user_id],
+                'content': message.content,
+                'creation_date': message.creation_date,
+                'read': message.read,
+                'updated': message.updated,
+            },
+            unreaded=unread_count,
+            user_1=profiles[chat.user_id_1],
+            user_2=profiles[chat.user_id_2],
+        ))
+    return chats_info
+
+
+class ChatMembersCache:
+    '''LRU-кэш участников чатов для проверок доступа в сокетах.
+
+    Участники чата не меняются, поэтому запись живёт до удаления чата
+    или истечения ttl (удаление могло произойти в другом воркере).
+    '''
+
+    def __init__(self, max_size: int, ttl: float):
+        self.members: TTLCache[uuid.UUID, Tuple[uuid.UUID, uuid.UUID]] = TTLCache(max_size, ttl)
+
+    async def get(self, chat_id: uuid.UUID) -> Tuple[uuid.UUID, uuid.UUID] | None:
+        members = self.members.get(chat_id)
+        if members is not None:
+            return members
+        async with get_async_session_context() as db:
+            members = await ChatsCrud(db).get_chat_members(chat_id=chat_id)
+        if members is None:
+            return None
+        return self.members.set(chat_id, tuple(members))
+
+    def invalidate(self, chat_id: uuid.UUID):
+        self.members.pop(chat_id)
+
+
+chat_members_cache = ChatMembersCache(
+    max_size=int(getenv('CHAT_MEMBERS_CACHE_SIZE', 10000)),
+    ttl=float(getenv('CHAT_MEMBERS_CACHE_TTL', 300))
+)
+
+
+async def can_read_chat(chat_id: uuid.UUID, user_id: uuid.UUID) -> bool | None:
+    '''None, если чат не найден'''
+    members = await chat_members_cache.get(chat_id)
+    if members is None:
+        return None
+    return user_id in members
@@ -1,28 +1,99 @@
-import io
+import asyncio
+import contextlib
 import os
 import shutil
-from uuid import UUID
+import tempfile
+import time
+from typing import Iterable, List, Tuple
+from uuid import UUID, uuid4
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
 from models.files import Image
 from PIL import Image as pillow
 from cruds.base_crud import BaseCRUD
+from cruds.file_cruds import FilesCRUD
+from db.db import async_session_maker, use_primary
+from utilities.images import ImageDecodeError, ImageSize, image_formats, make_variant, process_image, run_in_image_executor
 content_folder = '/content'
 images_folder = 'images'
+blobs_folder = 'images/blobs'
+variants_folder = 'images/variants'
+# варианты, которые создаются сразу при загрузке, остальные - по запросу
+eager_variants = [('thumb', 'webp'), ('medium', 'webp')]
 images_extension = '.png'
+upload_chunk_size = 1024 * 1024
 api_host = os.getenv('API_HOST', '')
 supported_image_extensions = {
     ex for ex, f in pillow.registered_extensions().items() if f in pillow.OPEN}
 
 
+def get_image_file_path(image_id: UUID) -> str:
+    return '/'.join([content_folder, images_folder, str(image_id)]) + images_extension
+
+
 async def get_image_path(image: Image) -> str:
-    return '/'.join([content_folder, images_folder, str(image.id)]) + images_extension
+    return get_image_file_path(image.id)
+
+
+def get_blob_path(blob_hash: str) -> str:
+    return '/'.join([content_folder, blobs_folder, blob_hash]) + images_extension
+
+
+def link_image(image_id: UUID, blob_hash: str):
+    '''Путь изображения становится ссылкой на blob, поэтому файл по-прежнему
+    находится по идентификатору без запроса к БД'''
+    image_path = get_image_file_path(image_id)
+    relative_blob_path = os.path.relpath(get_blob_path(blob_hash), os.path.dirname(image_path))
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(image_path)
+    os.symlink(relative_blob_path, image_path)
+
+
+def get_source_key(image_id: UUID) -> str:
+    '''Ключ вариантов: хэш blob или идентификатор для изображений без blob'''
+    try:
+        return Path(os.readlink(get_image_file_path(image_id))).stem
+    except OSError:
+        return str(image_id)
+
+
+def get_variant_path_template() -> str:
+    return '/'.join([content_folder, variants_folder, '{key}_{size}.{format}'])
+
+
+def get_variant_path(key: str, size: str, format: str) -> str:
+    return get_variant_path_template().format(key=key, size=size, format=format)
+
+
+def get_variant_paths(key: str) -> List[Path]:
+    '''Все возможные пути вариантов: без сканирования каталога вариантов'''
+    return [Path(get_variant_path(key, size.value, format)) for size in ImageSize for format in image_formats]
+
+
+def get_variant_key(file_name: str) -> str:
+    '''Ключ варианта из имени файла {key}_{size}.{format}'''
+    return file_name.split('.', 1)[0].rsplit('_', 1)[0]
+
+
+async def get_image_variant(image_id: UUID, size: str, format: str) -> str | None:
+    '''Возвращает путь к варианту изображения, создавая его при первом запросе'''
+    image_path = get_image_file_path(image_id)
+    if size == 'full' and format == 'png':
+        return image_path if os.path.exists(image_path) else None
+    variant_path = get_variant_path(get_source_key(image_id), size, format)
+    if os.path.exists(variant_path):
+        return variant_path
+    if not os.path.exists(image_path):
+        return None
+    await run_in_image_executor(make_variant, image_path, variant_path, size, format)
+    return variant_path
 
 
 def init_folders():
     Path(content_folder).mkdir(exist_ok=True)
-    for folder in [images_folder]:
+    for folder in [images_folder, blobs_folder, variants_folder]:
         Path('/'.join([content_folder, folder])).mkdir(exist_ok=True)
 
 
@@ -31,16 +102,28 @@ def get_image_link(image_id: UUID) -> str:
 
 
 async def duplicate_image(db: AsyncSession, image: Image) -> Image:
-    image_model = await BaseCRUD(db).create(Image())
-    image_path = await get_image_path(image=image)
-    new_image_path = await get_image_path(image=image_model)
-    shutil.copy(image_path, new_image_path)
+    if image.blob_hash is None:
+        image_model = await BaseCRUD(db).create(Image(id=uuid4()))
+        image_path = await get_image_path(image=image)
+        new_image_path = await get_image_path(image=image_model)
+        await run_in_threadpool(shutil.copy, image_path, new_image_path)
+        return image_model
+    # копия - это только новая строка и ссылка на тот же blob
+    await FilesCRUD(db).acquire_blobs([image.blob_hash])
+    image_model = await BaseCRUD(db).create(Image(id=uuid4(), blob_hash=image.blob_hash))
+    link_image(image_model.id, image.blob_hash)
     return image_model
 
 
-async def save_image(db: AsyncSession,  upload_file: UploadFile, resize_image_options=(1000, 1000),
-                     detail_error_message="поврежденное изображение") -> Image:
+async def process_upload(upload_file: UploadFile, resize_image_options=(1000, 1000),
+                         detail_error_message="поврежденное изображение") -> Tuple[str, str]:
+    '''Обрабатывает загруженное изображение, не блокируя цикл событий.
 
+    Загрузка копируется во временный файл в пуле потоков, а декодирование,
+    уменьшение и кодирование выполняются в пуле изображений. Возвращает
+    хэш и временный путь результата, который переносится в хранилище
+    blobs после коммита.
+    '''
     originalFileName = upload_file.filename
     originalFilePath = Path(originalFileName)
     suffix = originalFilePath.suffix
@@ -48,17 +131,224 @@ async def save_image(db: AsyncSession,  upload_file: UploadFile, resize_image_op
         raise HTTPException(
             status_code=422, detail="Расширение изображения не поддерживается")
 
-    buf = io.BytesIO()
-    buf.name = originalFileName
-    shutil.copyfileobj(upload_file.file, buf)
-    buf.seek(0)
-
+    fd, temp_path = tempfile.mkstemp(suffix=suffix)
+    result_path = get_blob_path(f'upload-{uuid4()}')
     try:
-        image = pillow.open(buf)
-        image.thumbnail(resize_image_options)
-        image_model = await BaseCRUD(db).create(Image())
-        image_path = await get_image_path(image=image_model)
-        image.save(image_path)
-        return image_model
-    except:
+        with os.fdopen(fd, 'wb') as temp_file:
+            await run_in_threadpool(shutil.copyfileobj, upload_file.file, temp_file, upload_chunk_size)
+        variants = [(size, format) for size, format in eager_variants if format in image_formats]
+        blob_hash = await run_in_image_executor(
+            process_image, temp_path, result_path, tuple(resize_image_options),
+            get_variant_path_template(), variants)
+        return blob_hash, result_path
+    except ImageDecodeError:
         raise HTTPException(status_code=422, detail=detail_error_message)
+    finally:
+        os.unlink(temp_path)
+
+
+async def save_images(db: AsyncSession, upload_files: List[UploadFile], resize_image_options=(1000, 1000),
+                      detail_error_message="поврежденное изображение") -> List[Image]:
+    '''Обрабатывает несколько изображений параллельно и сохраняет их одним коммитом.
+
+    Одинаковые изображения хранятся одним blob.
+    '''
+    results = await asyncio.gather(*[
+        process_upload(upload_file, resize_image_options, detail_error_message)
+        for upload_file in upload_files
+    ], return_exceptions=True)
+    processed = [result for result in results if not isinstance(result, Exception)]
+    try:
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+        images = [Image(id=uuid4(), blob_hash=blob_hash) for blob_hash, _ in processed]
+        await FilesCRUD(db).acquire_blobs([image.blob_hash for image in images])
+        db.add_all(images)
+        await db.commit()
+    except BaseException:
+        for _, result_path in processed:
+            Path(result_path).unlink(missing_ok=True)
+        raise
+    # файлы переносятся после коммита: сборщик blobs к этому моменту либо
+    # уже удалил старый файл, либо увидит новую ссылку
+    for image, (blob_hash, result_path) in zip(images, processed):
+        os.replace(result_path, get_blob_path(blob_hash))
+        link_image(image.id, blob_hash)
+    return images
+
+
+async def save_image(db: AsyncSession,  upload_file: UploadFile, resize_image_options=(1000, 1000),
+                     detail_error_message="поврежденное изображение") -> Image:
+    images = await save_images(db, [upload_file], resize_image_options, detail_error_message)
+    return images[0]
+
+
+async def collect_image_blobs(db: AsyncSession, grace_period: float) -> int:
+    '''Удаляет файлы blobs, на которые больше не ссылается ни одно изображение'''
+    blobs_hashes = await FilesCRUD(db).delete_orphan_blobs(grace_period)
+
+    def unlink_blobs():
+        for blob_hash in blobs_hashes:
+            Path(get_blob_path(blob_hash)).unlink(missing_ok=True)
+            for variant_path in get_variant_paths(blob_hash):
+                variant_path.unlink(missing_ok=True)
+    # файлы удаляются до коммита, пока строки blobs заблокированы
+    await run_in_threadpool(unlink_blobs)
+    await db.commit()
+    return len(blobs_hashes)
+
+
+def unlink_image_files(images_ids: Iterable[UUID]):
+    for image_id in images_ids:
+        Path(get_image_file_path(image_id)).unlink(missing_ok=True)
+        for variant_path in get_variant_paths(str(image_id)):
+            variant_path.unlink(missing_ok=True)
+
+
+class ImageFilesDeleter:
+    '''Удаляет файлы изображений пачками в пуле потоков.
+
+    Идентификаторы передаются после коммита, поэтому откат транзакции не
+    оставляет строк без файлов.
+    '''
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.pending: set[UUID] = set()
+        self.task: asyncio.Task | None = None
+
+    def schedule(self, images_ids: Iterable[UUID]):
+        self.pending.update(images_ids)
+        if self.pending and self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while self.pending:
+                batch = [self.pending.pop() for _ in range(min(self.batch_size, len(self.pending)))]
+                try:
+                    await run_in_threadpool(unlink_image_files, batch)
+                except Exception as e:
+                    print(e)
+        finally:
+            self.task = None
+
+    async def stop(self):
+        if self.task is not None:
+            await self.task
+
+
+def list_stale_files(folder: str, grace_period: float) -> List[os.DirEntry]:
+    cutoff = time.time() - grace_period
+    with os.scandir(folder) as entries:
+        return [entry for entry in entries
+                if not entry.is_dir(follow_symlinks=False)
+                and entry.stat(follow_symlinks=False).st_mtime < cutoff]
+
+
+async def sweep_image_files(db: AsyncSession, grace_period: float, batch_size: int = 1000) -> int:
+    '''Сверяет файлы в /content/images с таблицами images и image_blobs.
+
+    Удаляет файлы изображений, blobs и вариантов, которых нет в БД, а также
+    недописанные загрузки и варианты старше grace_period секунд. Варианты
+    с ключом-идентификатором принадлежат изображениям без blob.
+    '''
+    files_crud = FilesCRUD(db)
+    images_files = {}
+    blobs_files = {}
+    variants_files = {}
+    removed = []
+    for entry in await run_in_threadpool(list_stale_files, '/'.join([content_folder, images_folder]), grace_period):
+        with contextlib.suppress(ValueError):
+            images_files[UUID(Path(entry.name).stem)] = entry.path
+    for entry in await run_in_threadpool(list_stale_files, '/'.join([content_folder, blobs_folder]), grace_period):
+        if entry.name.startswith('upload-'):
+            removed.append(entry.path)
+        else:
+            blobs_files[Path(entry.name).stem] = entry.path
+    for entry in await run_in_threadpool(list_stale_files, '/'.join([content_folder, variants_folder]), grace_period):
+        if entry.name.endswith('.tmp'):
+            removed.append(entry.path)
+        else:
+            variants_files.setdefault(get_variant_key(entry.name), []).append(entry.path)
+    variants_images_ids = {}
+    for key in list(variants_files):
+        with contextlib.suppress(ValueError):
+            image_id = UUID(key)
+            variants_images_ids[image_id] = variants_files.pop(key)
+
+    images_ids = list(images_files.keys() | variants_images_ids.keys())
+    for start in range(0, len(images_ids), batch_size):
+        batch = images_ids[start:start + batch_size]
+        existing = set(await files_crud.get_existing_images_ids(batch))
+        for image_id in batch:
+            if image_id not in existing:
+                if image_id in images_files:
+                    removed.append(images_files[image_id])
+                removed += variants_images_ids.get(image_id, [])
+    blobs_hashes = list(blobs_files.keys() | variants_files.keys())
+    for start in range(0, len(blobs_hashes), batch_size):
+        batch = blobs_hashes[start:start + batch_size]
+        existing = set(await files_crud.get_existing_blobs_hashes(batch))
+        for blob_hash in batch:
+            if blob_hash not in existing:
+                if blob_hash in blobs_files:
+                    removed.append(blobs_files[blob_hash])
+                removed += variants_files.get(blob_hash, [])
+
+    def unlink_files() -> int:
+        count = 0
+        for path in removed:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+                count += 1
+        return count
+    return await run_in_threadpool(unlink_files)
+
+
+class ImageFilesCollector:
+    '''Периодически удаляет blobs без ссылок и файлы без строк в БД.
+
+    grace_period защищает blob, ссылку на который только что удалили, от
+    гонки с повторной загрузкой того же изображения, а свежие файлы - от
+    удаления до коммита загрузки.
+    '''
+
+    def __init__(self, interval: float, grace_period: float):
+        self.interval = interval
+        self.grace_period = grace_period
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with async_session_maker() as session:
+                    await collect_image_blobs(use_primary(session), self.grace_period)
+                    await sweep_image_files(use_primary(session), self.grace_period)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+
+
+image_files_deleter = ImageFilesDeleter(
+    batch_size=int(os.getenv('IMAGE_DELETE_BATCH_SIZE', 500))
+)
+image_files_collector = ImageFilesCollector(
+    interval=float(os.getenv('IMAGE_GC_INTERVAL', 3600)),
+    grace_period=float(os.getenv('IMAGE_GC_GRACE', 3600))
+)
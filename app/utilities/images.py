@@ -0,0 +1,175 @@
+'''Обработка изображений вне цикла событий.
+
+Модуль зависит только от Pillow, чтобы процессы пула (spawn) запускались
+быстро и не подключались к БД.
+'''
+import asyncio
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import contextlib
+from enum import Enum
+import hashlib
+import multiprocessing
+import os
+from os import getenv
+from pathlib import Path
+from typing import Iterable, Tuple
+from PIL import Image as pillow
+
+_image_executor: Executor | None = None
+
+# размеры уменьшенных копий, full - исходное изображение
+image_sizes = {'thumb': 128, 'medium': 480}
+# формат: (формат Pillow, MIME-тип, параметры сохранения)
+image_formats = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+}
+# AVIF доступен, только если установлен плагин Pillow (pillow-avif-plugin)
+if 'AVIF' in pillow.registered_extensions().values():
+    image_formats['avif'] = ('AVIF', 'image/avif', {'quality': 60})
+# порядок предпочтения при выборе формата по заголовку Accept
+preferred_formats = [format for format in ('avif', 'webp') if format in image_formats]
+
+ImageSize = Enum('ImageSize', {size: size for size in [*image_sizes, 'full']}, type=str)
+ImageFormat = Enum('ImageFormat', {format: format for format in image_formats}, type=str)
+
+# (размер, формат)
+Variant = Tuple[str, str]
+
+
+class ImageDecodeError(ValueError):
+    '''Файл не является изображением или поврежден'''
+
+
+@contextlib.contextmanager
+def decoding():
+    '''Превращает ошибки чтения изображения в ImageDecodeError, чтобы их можно
+    было отличить от ошибок записи и пула'''
+    try:
+        yield
+    except (pillow.UnidentifiedImageError, pillow.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ImageDecodeError(str(e)) from e
+
+
+def save_variant(image: pillow.Image, target_path: str, size: str, format: str) -> None:
+    pillow_format, _, options = image_formats[format]
+    if size in image_sizes:
+        image = image.copy()
+        image.thumbnail((image_sizes[size], image_sizes[size]))
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    # запись во временный файл и переименование: параллельные запросы
+    # одного варианта не увидят недописанный файл
+    temp_path = f'{target_path}.{os.getpid()}.tmp'
+    try:
+        image.save(temp_path, pillow_format, **options)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def process_image(source_path: str, target_path: str, size: Tuple[int, int],
+                  variant_path_template: str = '', variants: Iterable[Variant] = ()) -> str:
+    '''Декодирует, уменьшает и сохраняет изображение. Выполняется в пуле.
+
+    Возвращает sha256 сохраненного файла. Варианты сохраняются по шаблону
+    пути с этим хэшем, уже существующие не пересоздаются.
+    '''
+    try:
+        with decoding():
+            image = pillow.open(source_path)
+        with image:
+            with decoding():
+                image.thumbnail(size)
+            image.save(target_path, 'PNG')
+            blob_hash = file_hash(target_path)
+            for variant_size, format in variants:
+                variant_path = variant_path_template.format(
+                    key=blob_hash, size=variant_size, format=format)
+                if not os.path.exists(variant_path):
+                    save_variant(image, variant_path, variant_size, format)
+        return blob_hash
+    except BaseException:
+        Path(target_path).unlink(missing_ok=True)
+        raise
+
+
+def make_variant(source_path: str, target_path: str, size: str, format: str) -> None:
+    '''Создает недостающий вариант из исходного изображения. Выполняется в пуле'''
+    with decoding():
+        image = pillow.open(source_path)
+    with image:
+        with decoding():
+            image.load()
+        save_variant(image, target_path, size, format)
+
+
+def negotiate_format(accept: str, size: str) -> str:
+    '''Выбирает формат по заголовку Accept.
+
+    Без явной поддержки современных форматов отдается исходный PNG для full
+    и JPEG для уменьшенных копий.
+    '''
+    accepted = set()
+    for item in accept.split(','):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        if 'q=0' in params or 'q=0.0' in params:
+            continue
+        accepted.add(media_type.lower())
+    for format in preferred_formats:
+        if image_formats[format][1] in accepted:
+            return format
+    return 'png' if size == 'full' else 'jpeg'
+
+
+def get_image_executor() -> Executor:
+    global _image_executor
+    if _image_executor is None:
+        workers = int(getenv('IMAGE_WORKERS', 2))
+        if getenv('IMAGE_EXECUTOR', 'process') == 'thread':
+            _image_executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='images')
+        else:
+            _image_executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _image_executor
+
+
+async def run_in_image_executor(func, *args):
+    '''Выполняет func в пуле изображений.
+
+    Если процесс пула погиб (например, убит по нехватке памяти), пул
+    становится непригодным: он пересоздается, а задача повторяется один раз.
+    '''
+    for attempt in range(2):
+        executor = get_image_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        except BrokenExecutor:
+            discard_image_executor(executor)
+            if attempt:
+                raise
+
+
+def discard_image_executor(executor: Executor):
+    global _image_executor
+    if _image_executor is executor:
+        _image_executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_image_executor():
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=False, cancel_futures=True)
+        _image_executor = None
@@ -10,3 +10,12 @@ async def send_notification(user_id: uuid.UUID, message: str, header: str, db: A
     db_notification = await NotificationsCrud(db).create_notification(user_id=user_id, message=message, header=header)
     await notifier.push(user_id=user_id, data=NotificationSchema(**db_notification.__dict__).model_dump_json())
     return db_notification
+
+
+async def send_notifications(notifications: list[dict], db: AsyncSession):
+    '''Сохраняет пачку уведомлений одним запросом и рассылает их'''
+    notifier = get_notifier('notifications')()
+    db_notifications = await NotificationsCrud(db).create_notifications(notifications)
+    for db_notification in db_notifications:
+        await notifier.push(user_id=db_notification.user_id, data=NotificationSchema(**db_notification.__dict__).model_dump_json())
+    return db_notifications
@@ -0,0 +1,21 @@
+import base64
+from datetime import datetime
+import json
+from typing import Tuple
+from uuid import UUID
+from fastapi import HTTPException
+
+
+def encode_cursor(creation_date: datetime, id: UUID) -> str:
+    '''Непрозрачный курсор по ключу (creation_date, id)'''
+    raw = json.dumps([creation_date.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        creation_date, id = json.loads(raw)
+        return datetime.fromisoformat(creation_date), UUID(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail='Некорректный курсор')
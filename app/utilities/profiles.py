@@ -0,0 +1,35 @@
+from os import getenv
+from typing import Dict, Iterable
+import uuid
+from models.user import User
+from schemas.users import UserReadInstitution
+from utilities.cache import TTLCache
+
+
+class ProfileCache:
+    '''LRU-кэш сериализованных профилей пользователей (форма UserReadInstitution).
+
+    Профиль включает изображение, хобби и учебное заведение с городом,
+    поэтому списки пользователей собираются без selectinload. Правки
+    справочников (хобби, учебные заведения) запись не сбрасывают и видны
+    после истечения ttl.
+    '''
+
+    def __init__(self, max_size: int, ttl: float):
+        self.profiles: TTLCache[uuid.UUID, Dict] = TTLCache(max_size, ttl)
+
+    def get_many(self, users_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, Dict]:
+        return self.profiles.get_many(users_ids)
+
+    def set(self, user: User) -> Dict:
+        '''user должен быть загружен с UsersCrud.selectinload_user_options()'''
+        return self.profiles.set(user.id, UserReadInstitution.model_validate(user).model_dump())
+
+    def invalidate(self, user_id: uuid.UUID):
+        self.profiles.pop(user_id)
+
+
+profile_cache = ProfileCache(
+    max_size=int(getenv('PROFILE_CACHE_SIZE', 50000)),
+    ttl=float(getenv('PROFILE_CACHE_TTL', 300))
+)
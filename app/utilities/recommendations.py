@@ -0,0 +1,151 @@
+from collections import deque
+from os import getenv
+import random
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, NamedTuple, Tuple
+from utilities.cache import TTLCache
+
+CandidatesLoader = Callable[[int], Awaitable[List[uuid.UUID]]]
+
+
+class CandidatePool:
+    '''Пулы кандидатов в рекомендации, отдельные для каждого пользователя и набора фильтров.
+
+    Пул наполняется одним индексным запросом на partition_size кандидатов
+    и дальше отдаёт их из памяти, пока не опустеет или не истечет ttl.
+    Пользователи, которых лайкнули, сразу удаляются из пулов (discard).
+    '''
+
+    def __init__(self, partition_size: int, ttl: float, max_users: int):
+        self.partition_size = partition_size
+        self.ttl = ttl
+        # ttl пользователя продлевается с каждым новым пулом, у пулов свой срок
+        self.pools: TTLCache[uuid.UUID, Dict[Hashable, Tuple[float, deque]]] = TTLCache(max_users, ttl)
+
+    def _get(self, user_id: uuid.UUID, key: Hashable) -> deque | None:
+        user_pools = self.pools.get(user_id)
+        if not user_pools or key not in user_pools:
+            return None
+        expires, candidates = user_pools[key]
+        if expires < time.monotonic():
+            del user_pools[key]
+            return None
+        return candidates
+
+    def _set(self, user_id: uuid.UUID, key: Hashable, candidates: List[uuid.UUID], shuffle: bool) -> deque:
+        if shuffle:
+            random.shuffle(candidates)
+        pool = deque(candidates)
+        user_pools = self.pools.get(user_id) or {}
+        user_pools[key] = (time.monotonic() + self.ttl, pool)
+        self.pools.set(user_id, user_pools)
+        return pool
+
+    async def take(self, user_id: uuid.UUID, key: Hashable, count: int, loader: CandidatesLoader, shuffle: bool = True) -> List[uuid.UUID]:
+        '''shuffle=False сохраняет порядок, в котором кандидатов вернул loader (ранжирование)'''
+        pool = self._get(user_id, key)
+        if pool is None or len(pool) < count:
+            candidates = list(pool or [])
+            loaded = await loader(max(self.partition_size, count))
+            known = set(candidates)
+            candidates += [id for id in loaded if id not in known]
+            pool = self._set(user_id, key, candidates, shuffle)
+        return [pool.popleft() for _ in range(min(count, len(pool)))]
+
+    def discard(self, user_id: uuid.UUID, candidate_id: uuid.UUID):
+        for _, candidates in (self.pools.get(user_id) or {}).values():
+            try:
+                candidates.remove(candidate_id)
+            except ValueError:
+                pass
+
+    def invalidate(self, user_id: uuid.UUID):
+        self.pools.pop(user_id)
+
+
+class ScoringProfile(NamedTuple):
+    hobbies_mask: int
+    institution_id: uuid.UUID | None
+    city_id: uuid.UUID | None
+
+
+ProfilesLoader = Callable[[List[uuid.UUID]], Awaitable[Iterable[Tuple[uuid.UUID, uuid.UUID | None, uuid.UUID | None, List[uuid.UUID]]]]]
+
+
+class ScoringProfiles:
+    '''LRU-кэш компактных профилей пользователей для ранжирования рекомендаций.
+
+    Хобби пользователя хранятся битовой маской по порядковому номеру хобби,
+    поэтому сходство по Жаккару считается двумя побитовыми операциями и
+    подсчётом единиц без соединения таблиц в SQL.
+    '''
+
+    def __init__(self, max_size: int, ttl: float, institution_weight: float, city_weight: float):
+        self.institution_weight = institution_weight
+        self.city_weight = city_weight
+        self.hobby_ordinals: Dict[uuid.UUID, int] = {}
+        self.profiles: TTLCache[uuid.UUID, ScoringProfile] = TTLCache(max_size, ttl)
+
+    def hobby_bit(self, hobby_id: uuid.UUID) -> int:
+        if hobby_id not in self.hobby_ordinals:
+            self.hobby_ordinals[hobby_id] = len(self.hobby_ordinals)
+        return 1 << self.hobby_ordinals[hobby_id]
+
+    async def get_many(self, user_ids: List[uuid.UUID], loader: ProfilesLoader) -> Dict[uuid.UUID, ScoringProfile]:
+        profiles = self.profiles.get_many(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in profiles]
+        if missing:
+            for user_id, institution_id, city_id, hobbies_ids in await loader(missing):
+                mask = 0
+                for hobby_id in hobbies_ids:
+                    mask |= self.hobby_bit(hobby_id)
+                profiles[user_id] = self.profiles.set(
+                    user_id, ScoringProfile(mask, institution_id, city_id))
+        return profiles
+
+    def score(self, user: ScoringProfile, candidate: ScoringProfile) -> float:
+        union = (user.hobbies_mask | candidate.hobbies_mask).bit_count()
+        score = (user.hobbies_mask & candidate.hobbies_mask).bit_count() / union if union else 0.0
+        if user.institution_id is not None and user.institution_id == candidate.institution_id:
+            score += self.institution_weight
+        if user.city_id is not None and user.city_id == candidate.city_id:
+            score += self.city_weight
+        return score
+
+    async def rank(self, user_id: uuid.UUID, candidates_ids: List[uuid.UUID], loader: ProfilesLoader) -> List[uuid.UUID]:
+        profiles = await self.get_many([user_id] + candidates_ids, loader)
+        user = profiles.get(user_id)
+        if user is None:
+            return candidates_ids
+        scores = {
+            candidate_id: self.score(user, profiles[candidate_id])
+            for candidate_id in candidates_ids if candidate_id in profiles
+        }
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def toggle_hobby(self, user_id: uuid.UUID, hobby_id: uuid.UUID, added: bool):
+        profile = self.profiles.get(user_id)
+        if profile is None:
+            return
+        bit = self.hobby_bit(hobby_id)
+        mask = profile.hobbies_mask | bit if added else profile.hobbies_mask & ~bit
+        self.profiles.replace(user_id, profile._replace(hobbies_mask=mask))
+
+    def invalidate(self, user_id: uuid.UUID):
+        self.profiles.pop(user_id)
+
+
+candidate_pool = CandidatePool(
+    partition_size=int(getenv('RECOMMENDATIONS_POOL_SIZE', 100)),
+    ttl=float(getenv('RECOMMENDATIONS_POOL_TTL', 300)),
+    max_users=int(getenv('RECOMMENDATIONS_POOL_USERS', 10000))
+)
+scoring_profiles = ScoringProfiles(
+    max_size=int(getenv('RECOMMENDATIONS_PROFILES_SIZE', 100000)),
+    ttl=float(getenv('RECOMMENDATIONS_PROFILES_TTL', 600)),
+    institution_weight=float(
+        getenv('RECOMMENDATIONS_INSTITUTION_WEIGHT', 0.5)),
+    city_weight=float(getenv('RECOMMENDATIONS_CITY_WEIGHT', 0.25))
+)
+scoring_sample_factor = int(getenv('RECOMMENDATIONS_SCORING_SAMPLE', 10))
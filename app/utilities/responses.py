@@ -0,0 +1,122 @@
+from email.utils import formatdate, parsedate_to_datetime
+from hashlib import md5
+import os
+import typing
+import anyio
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+immutable_cache_control = 'public, max-age=31536000, immutable'
+
+
+class RangeFileResponse(FileResponse):
+    '''FileResponse, который отдает только байты с start по end включительно'''
+
+    def __init__(self, path: str, start: int, end: int, stat_result: os.stat_result, **kwargs):
+        super().__init__(path, status_code=206, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers['content-length'] = str(end - start + 1)
+        self.headers['content-range'] = f'bytes {start}-{end}/{stat_result.st_size}'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            'type': 'http.response.start',
+            'status': self.status_code,
+            'headers': self.raw_headers,
+        })
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode='rb') as file:
+            await file.seek(self.start)
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': bool(remaining),
+                })
+        if remaining:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+def parse_range(range_header: str, size: int) -> typing.Tuple[int, int] | None:
+    '''Разбирает одиночный диапазон bytes=start-end, bytes=start- или bytes=-suffix.
+
+    ValueError - диапазон синтаксически неверен и игнорируется (RFC 9110,
+    14.1.1), None - диапазон невыполним (416).
+    '''
+    unit, _, ranges = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        raise ValueError(range_header)
+    start, _, end = ranges.strip().partition('-')
+    if not (start or end) or not all(part.isdigit() for part in (start, end) if part):
+        raise ValueError(range_header)
+    if not start:
+        length = int(end)
+        if length == 0 or size == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        raise ValueError(range_header)
+    if start >= size:
+        return None
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+def is_not_modified(request: Request, etag: str, stat_result: os.stat_result) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix('W/')
+                for tag in if_none_match.split(',')}
+        return etag in tags or '*' in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return int(stat_result.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def immutable_file_response(request: Request, path: str, media_type: str, headers: typing.Dict[str, str] = None) -> Response | None:
+    '''Отдает неизменяемый файл с ETag, Last-Modified, 304 и Range.
+
+    Возвращает None, если файла нет.
+    '''
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except FileNotFoundError:
+        return None
+    etag = '"{}"'.format(md5(f'{path}-{stat_result.st_mtime}-{stat_result.st_size}'.encode(),
+                             usedforsecurity=False).hexdigest())
+    headers = {
+        **(headers or {}),
+        'cache-control': immutable_cache_control,
+        'etag': etag,
+        'last-modified': formatdate(stat_result.st_mtime, usegmt=True),
+        'accept-ranges': 'bytes',
+    }
+    if is_not_modified(request, etag, stat_result):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            byte_range = False
+        if byte_range is None:
+            return Response(status_code=416, headers={
+                **headers, 'content-range': f'bytes */{stat_result.st_size}'})
+        if byte_range:
+            return RangeFileResponse(path, *byte_range, stat_result=stat_result,
+                                     headers=headers, media_type=media_type)
+    return FileResponse(path, stat_result=stat_result, headers=headers, media_type=media_type)
@@ -1,11 +1,15 @@
-from fastapi import Depends, WebSocket, WebSocketException
-from users_controller import get_jwt_strategy
-from users_controller import get_jwt_strategy, get_user_manager
+from fastapi import WebSocket
+from users_controller import get_jwt_strategy, get_user_db_context, get_user_manager_context
+from db.db import get_async_session_context
 
 
-async def get_user_from_cookie(websocket: WebSocket, user_manager=Depends(get_user_manager), is_verified: bool = False):
+async def get_user_from_cookie(websocket: WebSocket, is_verified: bool = False):
+    '''Авторизует сокет по cookie, сессия БД закрывается до начала работы сокета'''
     cookie = websocket.cookies.get("fastapiusersauth")
-    user = await get_jwt_strategy().read_token(cookie, user_manager)
-    if not user or not user.is_active or user.is_verified if is_verified else False:
+    async with get_async_session_context() as session:
+        async with get_user_db_context(session) as user_db:
+            async with get_user_manager_context(user_db) as user_manager:
+                user = await get_jwt_strategy().read_token(cookie, user_manager)
+    if not user or not user.is_active or (is_verified and not user.is_verified):
         return
     return user